@@ -0,0 +1,139 @@
+import json
+import os
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+# Подписка на пороговое уведомление. symbol = None означает «любая монета».
+Alert = namedtuple('Alert', ['id', 'chat_id', 'symbol', 'metric', 'op', 'threshold', 'days'])
+
+METRICS = ('volatility', 'drawdown')
+OPERATORS = ('>', '<')
+ANY_SYMBOL = '*'
+
+# Индекс подписок: для каждой метрики, периода, оператора и монеты пороги хранятся
+# в отсортированном списке (threshold, id), поэтому при обновлении значения сработавшие
+# подписки находятся бинарным поиском за O(log n + k), без перебора всех пользователей.
+# Если задан path, подписки и время последних уведомлений сохраняются в JSON-файл.
+class AlertIndex:
+    def __init__(self, path=None, cooldown=6 * 3600):
+        self.path = path
+        self.alerts = {}  # {id: Alert}
+        self.buckets = {}  # {(metric, days, op, symbol): [(threshold, id)]}
+        self.last_values = {}  # {(symbol, days): (volatility, drawdown)}
+        self.last_notified = {}  # {(id, symbol): время последнего уведомления}
+        self.cooldown = cooldown
+        self.next_id = 1
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def bucket_key(self, alert):
+        return alert.metric, alert.days, alert.op, alert.symbol or ANY_SYMBOL
+
+    def index(self, alert):
+        self.alerts[alert.id] = alert
+        insort(self.buckets.setdefault(self.bucket_key(alert), []), (alert.threshold, alert.id))
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        self.alerts = {}
+        self.buckets = {}
+        for item in data.get('alerts', []):
+            self.index(Alert(**item))
+        self.last_notified = {(alert_id, symbol): at for alert_id, symbol, at in data.get('last_notified', [])}
+        self.next_id = max(data.get('next_id', 1), max(self.alerts, default=0) + 1)
+
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            'next_id': self.next_id,
+            'alerts': [alert._asdict() for alert in self.alerts.values()],
+            'last_notified': [[alert_id, symbol, at] for (alert_id, symbol), at in self.last_notified.items()],
+        }
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, chat_id, symbol, metric, op, threshold, days):
+        if metric not in METRICS:
+            raise ValueError(f'неизвестная метрика {metric}')
+        if op not in OPERATORS:
+            raise ValueError(f'неизвестный оператор {op}')
+        alert = Alert(self.next_id, chat_id, symbol, metric, op, float(threshold), days)
+        self.next_id += 1
+        self.index(alert)
+        self.save()
+        # Новая подписка должна проверить текущие значения, даже если они не менялись
+        for key in [k for k in self.last_values if k[1] == days and (symbol is None or k[0] == symbol)]:
+            del self.last_values[key]
+        return alert
+
+    def remove(self, alert_id, chat_id=None):
+        alert = self.alerts.get(alert_id)
+        if alert is None or (chat_id is not None and alert.chat_id != chat_id):
+            return False
+        del self.alerts[alert_id]
+        key = self.bucket_key(alert)
+        entries = self.buckets[key]
+        entries.pop(bisect_left(entries, (alert.threshold, alert.id)))
+        if not entries:
+            del self.buckets[key]
+        for notified_key in [k for k in self.last_notified if k[0] == alert_id]:
+            del self.last_notified[notified_key]
+        self.save()
+        return True
+
+    def for_chat(self, chat_id):
+        return [alert for alert in self.alerts.values() if alert.chat_id == chat_id]
+
+    # Какие монеты и за какие периоды нужно обновлять: {days: (set(symbols), есть ли подписки на любую монету)}
+    def targets(self):
+        result = {}
+        for alert in self.alerts.values():
+            symbols, has_any = result.get(alert.days, (set(), False))
+            if alert.symbol:
+                symbols.add(alert.symbol)
+            result[alert.days] = (symbols, has_any or alert.symbol is None)
+        return result
+
+    def matching(self, metric, days, symbol, value):
+        matched = []
+        for bucket_symbol in (symbol, ANY_SYMBOL):
+            entries = self.buckets.get((metric, days, '>', bucket_symbol))
+            if entries:
+                # value > threshold: все пороги строго меньше значения
+                matched.extend(entries[:bisect_left(entries, (value,))])
+            entries = self.buckets.get((metric, days, '<', bucket_symbol))
+            if entries:
+                # value < threshold: все пороги строго больше значения
+                matched.extend(entries[bisect_right(entries, (value, float('inf'))):])
+        return [self.alerts[alert_id] for _, alert_id in matched]
+
+    # Проверяет новое значение метрик монеты. Возвращает [(Alert, значение)] без повторов:
+    # неизменившиеся значения не проверяются, а одна подписка по одной монете
+    # срабатывает не чаще, чем раз в cooldown секунд.
+    def evaluate(self, symbol, days, volatility, drawdown, now=None):
+        values = (volatility, drawdown)
+        if self.last_values.get((symbol, days)) == values:
+            return []
+        self.last_values[(symbol, days)] = values
+
+        now = now or time.time()
+        fired = []
+        for metric, value in zip(METRICS, values):
+            for alert in self.matching(metric, days, symbol, value):
+                key = (alert.id, symbol)
+                if now - self.last_notified.get(key, 0) < self.cooldown:
+                    continue
+                self.last_notified[key] = now
+                fired.append((alert, value))
+        # Время уведомлений тоже сохраняем, чтобы после перезапуска не повторять их раньше cooldown
+        if fired:
+            self.save()
+        return fired
@@ -0,0 +1,88 @@
+import argparse
+import json
+import random
+import time
+
+import market_decoding
+
+# Микробенчмарк разбора ответов Bybit: исходный парсер (json + float() по строкам)
+# против market_decoding на синтетических ответах того же формата.
+
+def make_kline_payload(rows):
+    now = 1_700_000_000_000
+    price = random.uniform(0.01, 50_000)
+    klines = []
+    for i in range(rows):
+        price *= random.uniform(0.97, 1.03)
+        klines.append([
+            str(now - i * 3_600_000), f'{price:.6f}', f'{price * 1.01:.6f}', f'{price * 0.99:.6f}',
+            f'{price:.6f}', f'{random.uniform(1, 1e6):.4f}', f'{random.uniform(1, 1e8):.4f}'
+        ])
+    return json.dumps({'retCode': 0, 'retMsg': 'OK', 'result': {'category': 'spot', 'symbol': 'XUSDT', 'list': klines}}).encode()
+
+def make_tickers_payload(coins):
+    tickers = []
+    for i in range(coins):
+        price = random.uniform(0.01, 50_000)
+        tickers.append({
+            'symbol': f'COIN{i}USDT', 'bid1Price': f'{price:.6f}', 'ask1Price': f'{price:.6f}',
+            'lastPrice': f'{price:.6f}', 'prevPrice24h': f'{price:.6f}', 'price24hPcnt': '0.01',
+            'highPrice24h': f'{price:.6f}', 'lowPrice24h': f'{price:.6f}',
+            'turnover24h': f'{random.uniform(1, 1e9):.4f}', 'volume24h': f'{random.uniform(1, 1e9):.4f}'
+        })
+    return json.dumps({'retCode': 0, 'retMsg': 'OK', 'result': {'category': 'spot', 'list': tickers}}).encode()
+
+# Исходный разбор свечей из calculate_metrics
+def baseline_kline(raw):
+    data = json.loads(raw)
+    return [float(p[4]) for p in data['result']['list']]
+
+# Исходный разбор тикеров из get_coins
+def baseline_tickers(raw):
+    data = json.loads(raw)
+    coins = {}
+    for coin in data['result']['list']:
+        coins[coin['symbol']] = {
+            'market_cap': float(coin.get('marketCap', 0)) if coin.get('marketCap') else 0,
+            'volume': float(coin.get('volume24h', 0)) if coin.get('volume24h') else 0,
+            'turnover': float(coin.get('turnover24h', 0)) if coin.get('turnover24h') else 0,
+            'last_price': float(coin.get('lastPrice', 0)) if coin.get('lastPrice') else 0
+        }
+    return coins
+
+def measure(func, payloads, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            func(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение скорости разбора ответов Bybit')
+    parser.add_argument('--coins', type=int, default=500, help='количество ответов /kline (монет)')
+    parser.add_argument('--candles', type=int, default=240, help='количество свечей в одном ответе')
+    parser.add_argument('--tickers', type=int, default=600, help='количество монет в ответе /tickers')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    klines = [make_kline_payload(args.candles) for _ in range(args.coins)]
+    tickers = [make_tickers_payload(args.tickers)]
+
+    # Проверяем, что оба парсера дают одинаковые цены
+    assert list(market_decoding.decode_kline(klines[0])[3]) == baseline_kline(klines[0])
+
+    print(f'Бэкенд market_decoding: {market_decoding.JSON_BACKEND}')
+    for name, baseline, fast, payloads in (
+        (f'/kline ({args.coins} x {args.candles})', baseline_kline, market_decoding.decode_kline, klines),
+        (f'/tickers ({args.tickers})', baseline_tickers, market_decoding.decode_tickers, tickers),
+    ):
+        base_time = measure(baseline, payloads, args.repeat)
+        fast_time = measure(fast, payloads, args.repeat)
+        print(f'{name}: исходный {base_time * 1000:.1f} мс, market_decoding {fast_time * 1000:.1f} мс, '
+              f'ускорение x{base_time / fast_time:.2f}')
+
+if __name__ == '__main__':
+    main()
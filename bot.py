@@ -1,13 +1,40 @@
+import time
+
+# Засекаем время как можно раньше, чтобы измерять время от запуска процесса до первого ответа
+PROCESS_START_TIME = time.monotonic()
+
 import aiohttp
+import argparse
 import asyncio
-import pandas as pd
+import heapq
+import json
+import multiprocessing
+import secrets
+import signal
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from aiohttp import web
+from contextlib import asynccontextmanager
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, ConversationHandler
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 import logging
-import time
 import traceback
 
+from alerts import AlertIndex
+from cache_backends import create_cache_backend, wait_for_update
+from correlation import analyze_correlations
+from http_api import create_api_app
+from market_decoding import decode_kline, decode_tickers
+from rankings import Rankings
+from report_files import render_report_file
+from subscriptions import ReportSubscriptions
+from traffic_replay import RecordingSession, ReplaySession, TrafficRecorder
+from warm_snapshot import load_snapshot, save_snapshot
+
 # Состояния для ConversationHandler
 CHOOSING_COINS, CHOOSING_PERIOD, CHOOSING_SORT, CHOOSING_SORT_TYPE = range(4)
 
@@ -27,6 +54,94 @@ VOLATILITY_CACHE = {}  # {symbol: {days: volatility}}
 DRAWDOWN_CACHE = {}  # {symbol: {days: drawdown}}
 LAST_CACHE_TIME = None
 CACHE_DURATION = 3600  # 1 час
+ANALYSIS_PERIODS = (1, 3, 7, 10)  # Доступные периоды анализа, дней
+METRICS_BATCH_SIZE = 10  # Сколько монет обрабатывать за раз
+
+# Режим работы: 'single' — всё в одном процессе, 'frontend' — данные берутся у процесса-воркера
+MARKET_DATA_MODE = 'single'
+# Адрес процесса-воркера рыночных данных (локальный сокет)
+MARKET_DATA_HOST = '127.0.0.1'
+MARKET_DATA_PORT = 8765
+MARKET_DATA_STREAM_LIMIT = 16 * 1024 * 1024  # Максимальный размер одного сообщения
+# Запись трафика к Bybit в архив или воспроизведение записи вместо сети (для профилирования)
+TRAFFIC_RECORD_PATH = None
+TRAFFIC_REPLAY_PATH = None
+TRAFFIC_REPLAY_SPEED = 1.0  # 1 — с записанными задержками, N — в N раз быстрее, 0 — без задержек
+TRAFFIC_RECORDER = None
+TRAFFIC_REPLAY = None
+MARKET_DATA_CONNECT_ATTEMPTS = 10
+MARKET_DATA_WORKER = None  # Процесс-воркер в режиме split
+MARKET_DATA_WORKER_STOP_TIMEOUT = 30  # Сколько ждать сохранения снимка при остановке воркера
+
+# Общий кэш (для нескольких реплик бота): memory://, sqlite:///путь/к/cache.db или redis://host:port/db
+CACHE_BACKEND_URL = 'memory://'
+CACHE_BACKEND = None
+CACHE_LOCK_TTL = 60  # Сколько секунд одна реплика может держать право обновления ключа
+CACHE_WAIT_TIMEOUT = 30  # Сколько ждать, пока другая реплика обновит ключ
+COIN_CACHE_VERSION = 0  # Версия снимка списка монет, из которого построен COIN_CACHE
+METRICS_CACHE_TIME = {}  # {symbol: {days: время расчета}}
+CANDLE_CACHE = {}  # {(symbol, days, interval): (время запроса, (starts, closes))}
+METRICS_VERSION = 0  # Растет при каждом изменении метрик в кэше процесса
+# Рейтинги монет по метрикам для /rank, обновляются при каждом сохранении метрик
+RANKINGS = Rankings()
+RANK_UNIVERSE = frozenset()  # Монеты, которые сейчас входят в рейтинг
+RANK_UNIVERSE_SIZE = 500  # Сколько монет (по объему торгов) поддерживать в рейтинге
+RANK_REFRESH_INTERVAL = CACHE_DURATION
+RANK_TASK = None
+
+# Справочник инструментов: {symbol: {base, quote, tick_size, status}}
+INSTRUMENT_INDEX = {}
+LAST_INSTRUMENTS_TIME = None
+INSTRUMENTS_CACHE_DURATION = 24 * 3600  # Справочник меняется редко, обновляем раз в сутки
+# Котируемая валюта анализируемых пар (None — все пары, включая кросс-пары)
+QUOTE_FILTER = 'USDT'
+
+# Снимок кэша для теплого перезапуска
+SNAPSHOT_PATH = 'volatilitybot.snapshot'
+SNAPSHOT_INTERVAL = 600  # Как часто сохранять снимок, секунд
+SNAPSHOT_TASK = None
+FIRST_REQUEST_REPORTED = False
+
+# Результаты анализа для постраничного просмотра: {id: {results, days, sort_type, sort_by, created}}
+RESULT_STORE = {}
+RESULT_TTL = 900  # Сколько секунд результаты доступны для листания
+RESULTS_PER_PAGE = 10
+# Графики и файлы с результатами рисуются в отдельных процессах и кэшируются по ключу отчета
+REPORT_FILE_POOL = None
+REPORT_FILE_WORKERS = 2
+REPORT_FILE_CACHE = {}  # {(ключ отчета, тип файла): (время создания, future с (bytes, расширение))}
+REPORT_FILE_TTL = RESULT_TTL
+
+# Анализ корреляций: интервал свечей для каждого периода (часовые свечи дают достаточно точек)
+CORRELATION_INTERVALS = {1: '15', 3: '60', 7: '60', 10: '60'}
+CORRELATION_CACHE = {}  # {(tuple(symbols), days): (время расчета, результат)}
+CORRELATION_TOP_PAIRS = 15
+CORRELATION_CLUSTER_THRESHOLD = 0.8
+CORRELATION_MAX_CLUSTERS = 10
+CORRELATION_CLUSTER_PREVIEW = 8
+
+# Локальный HTTP API с таблицей тикеров и метрик (порт 0 — выключен)
+HTTP_API_HOST = '127.0.0.1'
+HTTP_API_PORT = 8080
+HTTP_API_RUNNER = None
+API_TABLE_CACHE = {}  # {(kind, days): (версия, строки)}
+
+# Пороговые уведомления
+ALERTS = AlertIndex('alerts.json')
+ALERT_REFRESH_INTERVAL = 300  # Неизменившиеся метрики из кэша проверка пропускает, поэтому она дешевая
+ALERT_UNIVERSE_SIZE = 200  # Сколько монет (по объему торгов) проверять для подписок на любую монету
+ALERT_METRIC_ALIASES = {
+    'volatility': 'volatility', 'vol': 'volatility', 'волатильность': 'volatility',
+    'drawdown': 'drawdown', 'dd': 'drawdown', 'просадка': 'drawdown',
+}
+ALERT_TASK = None
+NOTIFIER = None
+
+# Подписки на регулярные отчеты
+REPORTS = ReportSubscriptions('subscriptions.json')
+REPORT_COIN_COUNTS = (10, 50, 100, 200, 500)
+REPORT_CHECK_INTERVAL = 20  # Как часто проверять расписание, секунд
+REPORT_TASK = None
 
 # Функция для создания прогресс-бара
 def get_progress_bar(progress, total, width=20):
@@ -35,9 +150,49 @@ def get_progress_bar(progress, total, width=20):
     percent = (progress / total) * 100
     return f'[{bar}] {percent:.1f}%'
 
+# Возвращает бэкенд общего кэша, создавая его при первом обращении
+def get_cache_backend():
+    global CACHE_BACKEND
+    if CACHE_BACKEND is None:
+        CACHE_BACKEND = create_cache_backend(CACHE_BACKEND_URL)
+        logger.info(f"Используется бэкенд кэша {type(CACHE_BACKEND).__name__} ({CACHE_BACKEND_URL})")
+    return CACHE_BACKEND
+
+# Принимает снимок списка монет из общего кэша
+def apply_coins_snapshot(snapshot):
+    global COIN_CACHE, LAST_CACHE_TIME, COIN_CACHE_VERSION
+    COIN_CACHE = snapshot.value
+    LAST_CACHE_TIME = snapshot.updated
+    COIN_CACHE_VERSION = snapshot.version
+    return COIN_CACHE
+
+# Возвращает свежий снимок ключа из общего кэша; если он устарел, обновляет его через fetch.
+# Обновлять ключ в каждый момент времени может только одна реплика, остальные ждут новую версию.
+async def get_shared_snapshot(key, fetch, max_age):
+    backend = get_cache_backend()
+    snapshot = await backend.get(key)
+    if snapshot and time.time() - snapshot.updated < max_age and snapshot.value:
+        logger.info(f"Используется общий кэш {key} (версия {snapshot.version})")
+        return snapshot
+    
+    known_version = snapshot.version if snapshot else 0
+    if not await backend.try_lock(key, CACHE_LOCK_TTL):
+        logger.info(f"{key} обновляет другая реплика, ожидаем новую версию")
+        updated = await wait_for_update(backend, key, known_version, CACHE_WAIT_TIMEOUT)
+        if updated and updated.value:
+            return updated
+        logger.warning(f"Не получили обновление {key} от другой реплики")
+        return snapshot if snapshot and snapshot.value else None
+    try:
+        value = await fetch()
+        if not value:
+            return None
+        return await backend.put(key, value)
+    finally:
+        await backend.unlock(key)
+
 # Асинхронная функция для получения списка монет с Bybit
 async def get_coins(session):
-    global COIN_CACHE, LAST_CACHE_TIME
     current_time = time.time()
     
     if LAST_CACHE_TIME and (current_time - LAST_CACHE_TIME < CACHE_DURATION) and COIN_CACHE:
@@ -45,117 +200,592 @@ async def get_coins(session):
         return COIN_CACHE
     
     try:
-        logger.info("Запрос к API Bybit для получения списка монет")
-        async with session.get(f'{BYBIT_API_URL}/tickers', params={'category': 'spot'}) as response:
-            response.raise_for_status()
-            data = await response.json()
-            if data['retCode'] != 0:
-                logger.error(f"Ошибка API Bybit: {data['retMsg']}")
-                return {}
-            
-            # Обрабатываем все пары данных напрямую из API
-            coin_list = data['result']['list']
-            
-            # Сохраняем все данные о монетах, объем берем напрямую из поля volume24h
-            COIN_CACHE = {}
-            for coin in coin_list:
-                symbol = coin['symbol']
-                
-                # Берем правильные поля из API
-                volume = float(coin.get('volume24h', 0)) if coin.get('volume24h') else 0
-                turnover = float(coin.get('turnover24h', 0)) if coin.get('turnover24h') else 0
-                market_cap = float(coin.get('marketCap', 0)) if coin.get('marketCap') else 0
-                last_price = float(coin.get('lastPrice', 0)) if coin.get('lastPrice') else 0
-                
-                COIN_CACHE[symbol] = {
-                    'market_cap': market_cap,
-                    'volume': volume,
-                    'turnover': turnover,  # Денежный объем (объем * цена)
-                    'last_price': last_price
-                }
-            
-            LAST_CACHE_TIME = current_time
-            logger.info(f"Получено {len(COIN_CACHE)} монет")
-            
-            # Логируем топ монеты для проверки
-            volume_sorted = sorted(COIN_CACHE.items(), key=lambda x: x[1]['turnover'], reverse=True)[:10]
-            market_cap_sorted = sorted(COIN_CACHE.items(), key=lambda x: x[1]['market_cap'], reverse=True)[:10]
-            
-            volume_top_str = ", ".join([f"{coin[0]}={format_number(coin[1].get('turnover', 0))}" for coin in volume_sorted])
-            marketcap_top_str = ", ".join([f"{coin[0]}={format_number(coin[1].get('market_cap', 0))}" for coin in market_cap_sorted])
-            
-            logger.info(f"Топ-10 монет по объему в USD: {volume_top_str}")
-            logger.info(f"Топ-10 монет по капитализации: {marketcap_top_str}")
-            
-            return COIN_CACHE
+        snapshot = await get_shared_snapshot('tickers', lambda: fetch_coins(session), CACHE_DURATION)
+        if snapshot is None:
+            return {}
+        return apply_coins_snapshot(snapshot)
     except Exception as e:
         logger.error(f"Ошибка при получении списка монет: {e}")
         logger.error(traceback.format_exc())
         return {}
 
-# Асинхронная функция для получения исторических данных и расчета метрик
-async def calculate_metrics(session, symbol, days):
+# Асинхронная функция для получения справочника инструментов (базовая/котируемая валюта, шаг цены, статус)
+async def get_instruments(session):
+    global INSTRUMENT_INDEX, LAST_INSTRUMENTS_TIME
+    if LAST_INSTRUMENTS_TIME and (time.time() - LAST_INSTRUMENTS_TIME < INSTRUMENTS_CACHE_DURATION) and INSTRUMENT_INDEX:
+        return INSTRUMENT_INDEX
+    
+    try:
+        snapshot = await get_shared_snapshot('instruments', lambda: fetch_instruments(session), INSTRUMENTS_CACHE_DURATION)
+        if snapshot is None:
+            return INSTRUMENT_INDEX
+        INSTRUMENT_INDEX = snapshot.value
+        LAST_INSTRUMENTS_TIME = snapshot.updated
+        return INSTRUMENT_INDEX
+    except Exception as e:
+        logger.error(f"Ошибка при получении справочника инструментов: {e}")
+        logger.error(traceback.format_exc())
+        return INSTRUMENT_INDEX
+
+# Запрос справочника спотовых инструментов к API Bybit (с постраничной выдачей)
+async def fetch_instruments(session):
+    logger.info("Запрос к API Bybit для получения справочника инструментов")
+    instruments = {}
+    cursor = ''
+    while True:
+        params = {'category': 'spot', 'limit': 1000}
+        if cursor:
+            params['cursor'] = cursor
+        async with session.get(f'{BYBIT_API_URL}/instruments-info', params=params) as response:
+            response.raise_for_status()
+            data = await response.json()
+        if data['retCode'] != 0:
+            logger.error(f"Ошибка API Bybit: {data['retMsg']}")
+            return {}
+        for item in data['result']['list']:
+            instruments[item['symbol']] = {
+                'base': item.get('baseCoin', ''),
+                'quote': item.get('quoteCoin', ''),
+                'tick_size': item.get('priceFilter', {}).get('tickSize', ''),
+                'status': item.get('status', '')
+            }
+        cursor = data['result'].get('nextPageCursor')
+        if not cursor:
+            break
+    logger.info(f"Получено {len(instruments)} инструментов")
+    return instruments
+
+# Оставляет только торгуемые инструменты с нужной котируемой валютой
+def filter_tradable(coins_data, instruments, quote=None):
+    if not instruments:
+        # Справочник недоступен — анализируем все пары, как раньше
+        return coins_data
+    return {
+        symbol: info for symbol, info in coins_data.items()
+        if symbol in instruments
+        and instruments[symbol]['status'] == 'Trading'
+        and (not quote or instruments[symbol]['quote'] == quote)
+    }
+
+# Возвращает базовую и котируемую валюты пары: из справочника, а если пары там нет — по названию
+def split_symbol(symbol, instruments):
+    instrument = instruments.get(symbol)
+    if instrument and instrument['base'] and instrument['quote']:
+        return instrument['base'], instrument['quote']
+    symbol_parts = symbol.split('USDT')
+    base_currency = symbol_parts[0]
+    quote_currency = "USDT"
+    if len(symbol_parts) == 1 or not symbol_parts[0]:
+        # Если не USDT пара, пробуем другие варианты
+        for quote in ["BTC", "ETH", "USD", "EUR"]:
+            if quote in symbol:
+                parts = symbol.split(quote)
+                if parts[0]:
+                    base_currency = parts[0]
+                    quote_currency = quote
+                    break
+    return base_currency, quote_currency
+
+# Запрос списка монет к API Bybit
+async def fetch_coins(session):
+    logger.info("Запрос к API Bybit для получения списка монет")
+    async with session.get(f'{BYBIT_API_URL}/tickers', params={'category': 'spot'}) as response:
+        response.raise_for_status()
+        ret_code, ret_msg, columns = decode_tickers(await response.read())
+        if ret_code != 0:
+            logger.error(f"Ошибка API Bybit: {ret_msg}")
+            return {}
+        
+        # Ответ разбирается сразу в колонки, словари строим одним проходом
+        coins = {
+            symbol: {
+                'market_cap': market_cap,
+                'volume': volume,
+                'turnover': turnover,  # Денежный объем (объем * цена)
+                'last_price': last_price
+            }
+            for symbol, volume, turnover, market_cap, last_price in zip(
+                columns['symbol'], columns['volume'], columns['turnover'], columns['market_cap'], columns['last_price']
+            )
+        }
+        
+        logger.info(f"Получено {len(coins)} монет")
+        
+        # Логируем топ монеты для проверки
+        volume_sorted = sorted(coins.items(), key=lambda x: x[1]['turnover'], reverse=True)[:10]
+        market_cap_sorted = sorted(coins.items(), key=lambda x: x[1]['market_cap'], reverse=True)[:10]
+        
+        volume_top_str = ", ".join([f"{coin[0]}={format_number(coin[1].get('turnover', 0))}" for coin in volume_sorted])
+        marketcap_top_str = ", ".join([f"{coin[0]}={format_number(coin[1].get('market_cap', 0))}" for coin in market_cap_sorted])
+        
+        logger.info(f"Топ-10 монет по объему в USD: {volume_top_str}")
+        logger.info(f"Топ-10 монет по капитализации: {marketcap_top_str}")
+        
+        return coins
+
+# Сохраняет метрики в локальный кэш процесса
+def store_metrics(symbol, days, volatility, drawdown, updated):
+    global METRICS_VERSION
+    METRICS_VERSION += 1
+    VOLATILITY_CACHE.setdefault(symbol, {})[days] = volatility
+    DRAWDOWN_CACHE.setdefault(symbol, {})[days] = drawdown
+    METRICS_CACHE_TIME.setdefault(symbol, {})[days] = updated
+    if symbol in RANK_UNIVERSE:
+        RANKINGS.update(symbol, days, volatility, drawdown)
+
+# Асинхронная функция для получения исторических данных и расчета метрик.
+# max_age — допустимый возраст метрик из кэша (по умолчанию CACHE_DURATION).
+async def calculate_metrics(session, symbol, days, max_age=None):
+    max_age = max_age or CACHE_DURATION
     try:
         # Проверяем кэш
         cached_vol = VOLATILITY_CACHE.get(symbol, {}).get(days)
         cached_draw = DRAWDOWN_CACHE.get(symbol, {}).get(days)
-        if cached_vol is not None and cached_draw is not None:
+        cached_time = METRICS_CACHE_TIME.get(symbol, {}).get(days, 0)
+        if cached_vol is not None and cached_draw is not None and time.time() - cached_time < max_age:
             logger.info(f"Используется кэш для {symbol} за {days} дней")
             return cached_vol, cached_draw
         
-        logger.info(f"Запрос к API Bybit для {symbol} за {days} дней")
-        end_time = int(datetime.now().timestamp() * 1000)
-        start_time = int((datetime.now() - timedelta(days=days)).timestamp() * 1000)
-        params = {
-            'category': 'spot',
-            'symbol': symbol,
-            'interval': 'D' if days > 1 else '60',  # Дневные данные или часовые для 24ч
-            'start': start_time,
-            'end': end_time
-        }
-        async with session.get(f'{BYBIT_API_URL}/kline', params=params) as response:
-            response.raise_for_status()
-            data = await response.json()
-            if data['retCode'] != 0:
-                logger.warning(f"Ошибка API для {symbol}: {data['retMsg']}")
-                return None, None
-
-            prices = data['result']['list']
-            if not prices:
-                logger.warning(f"Нет данных для {symbol}")
-                return None, None
-
-            closes = [float(p[4]) for p in prices]
-            if not closes:
-                return None, None
-
-            # Волатильность: (max - min) / min * 100
-            max_price = max(closes)
-            min_price = min(closes)
-            volatility = ((max_price - min_price) / min_price) * 100 if min_price != 0 else 0
-            volatility = round(volatility, 2)
-
-            # Просадка: (max - last) / max * 100
-            last_price = closes[0]  # Последняя цена
-            drawdown = ((max_price - last_price) / max_price) * 100 if max_price != 0 else 0
-            drawdown = round(drawdown, 2)
-
-            # Сохраняем в кэш
-            VOLATILITY_CACHE.setdefault(symbol, {})[days] = volatility
-            DRAWDOWN_CACHE.setdefault(symbol, {})[days] = drawdown
-            logger.info(f"Рассчитаны метрики для {symbol}: волатильность={volatility}%, просадка={drawdown}%")
-            return volatility, drawdown
+        backend = get_cache_backend()
+        key = f'metrics:{symbol}:{days}'
+        snapshot = await backend.get(key)
+        if snapshot and time.time() - snapshot.updated < max_age:
+            logger.info(f"Используется общий кэш для {symbol} за {days} дней")
+            store_metrics(symbol, days, *snapshot.value, snapshot.updated)
+            return tuple(snapshot.value)
+        
+        known_version = snapshot.version if snapshot else 0
+        if not await backend.try_lock(key, CACHE_LOCK_TTL):
+            snapshot = await wait_for_update(backend, key, known_version, CACHE_WAIT_TIMEOUT)
+            if snapshot:
+                store_metrics(symbol, days, *snapshot.value, snapshot.updated)
+                return tuple(snapshot.value)
+            logger.warning(f"Не получили метрики {symbol} за {days} дней от другой реплики, считаем сами")
+            volatility, drawdown = await fetch_metrics(session, symbol, days)
+        else:
+            try:
+                volatility, drawdown = await fetch_metrics(session, symbol, days)
+                if volatility is not None:
+                    snapshot = await backend.put(key, [volatility, drawdown])
+            finally:
+                await backend.unlock(key)
+        
+        if volatility is None:
+            return None, None
+        
+        # Сохраняем в кэш
+        store_metrics(symbol, days, volatility, drawdown, time.time())
+        logger.info(f"Рассчитаны метрики для {symbol}: волатильность={volatility}%, просадка={drawdown}%")
+        return volatility, drawdown
     except Exception as e:
         logger.warning(f"Ошибка при расчете метрик для {symbol}: {e}")
         logger.warning(traceback.format_exc())
         return None, None
 
+# Запрос свечей к API Bybit: возвращает массивы времени открытия и цен закрытия (от новых к старым)
+async def fetch_candles(session, symbol, days, interval):
+    logger.info(f"Запрос к API Bybit для {symbol} за {days} дней (интервал {interval})")
+    end_time = int(datetime.now().timestamp() * 1000)
+    start_time = int((datetime.now() - timedelta(days=days)).timestamp() * 1000)
+    params = {
+        'category': 'spot',
+        'symbol': symbol,
+        'interval': interval,
+        'start': start_time,
+        'end': end_time,
+        'limit': 1000
+    }
+    async with session.get(f'{BYBIT_API_URL}/kline', params=params) as response:
+        response.raise_for_status()
+        ret_code, ret_msg, starts, closes = decode_kline(await response.read())
+        if ret_code != 0:
+            logger.warning(f"Ошибка API для {symbol}: {ret_msg}")
+            return None
+
+        if not closes:
+            logger.warning(f"Нет данных для {symbol}")
+            return None
+        return starts, closes
+
+# Свечи с кэшированием в памяти процесса (для анализа корреляций)
+async def get_candles(session, symbol, days, interval):
+    key = (symbol, days, interval)
+    cached = CANDLE_CACHE.get(key)
+    if cached and time.time() - cached[0] < CACHE_DURATION:
+        return cached[1]
+    candles = await fetch_candles(session, symbol, days, interval)
+    if candles is not None:
+        # Устаревшие свечи (в том числе монет, выпавших из выборки) удаляем, иначе кэш только растет
+        now = time.time()
+        for stale_key in [k for k, (fetched, _) in CANDLE_CACHE.items() if now - fetched >= CACHE_DURATION]:
+            del CANDLE_CACHE[stale_key]
+        CANDLE_CACHE[key] = (now, candles)
+    return candles
+
+# Запрос свечей к API Bybit и расчет волатильности и просадки
+async def fetch_metrics(session, symbol, days):
+    # Дневные данные или часовые для 24ч
+    candles = await fetch_candles(session, symbol, days, 'D' if days > 1 else '60')
+    if candles is None:
+        return None, None
+    _, closes = candles
+
+    # Волатильность: (max - min) / min * 100
+    max_price = max(closes)
+    min_price = min(closes)
+    volatility = ((max_price - min_price) / min_price) * 100 if min_price != 0 else 0
+    volatility = round(volatility, 2)
+
+    # Просадка: (max - last) / max * 100
+    last_price = closes[0]  # Последняя цена
+    drawdown = ((max_price - last_price) / max_price) * 100 if max_price != 0 else 0
+    drawdown = round(drawdown, 2)
+    return volatility, drawdown
+
+# Загружает снимок кэша, сохраненный предыдущим запуском
+def load_warm_snapshot():
+    global COIN_CACHE, LAST_CACHE_TIME
+    # При воспроизведении все данные должны браться из записи
+    if TRAFFIC_REPLAY_PATH:
+        return
+    started = time.monotonic()
+    try:
+        snapshot = load_snapshot(SNAPSHOT_PATH)
+    except Exception as e:
+        logger.error(f"Не удалось загрузить снимок кэша {SNAPSHOT_PATH}: {e}")
+        logger.error(traceback.format_exc())
+        return
+    if snapshot is None:
+        logger.info(f"Снимок кэша {SNAPSHOT_PATH} не найден, запуск с пустым кэшем")
+        return
+    saved_at, coins_time, coins, metrics = snapshot
+    if coins:
+        COIN_CACHE = coins
+        LAST_CACHE_TIME = coins_time or None
+    for symbol, days, volatility, drawdown, updated in metrics:
+        store_metrics(symbol, days, volatility, drawdown, updated)
+    logger.info(
+        f"Загружен снимок кэша: {len(coins)} монет, {len(metrics)} метрик, возраст {time.time() - saved_at:.0f} с, "
+        f"загрузка {(time.monotonic() - started) * 1000:.1f} мс"
+    )
+
+# Сохраняет таблицу тикеров и рассчитанные метрики в снимок
+async def save_warm_snapshot():
+    if TRAFFIC_REPLAY_PATH or (not COIN_CACHE and not VOLATILITY_CACHE):
+        return
+    # Копируем данные в цикле событий, а файл пишем в отдельном потоке
+    coins = dict(COIN_CACHE)
+    # Устаревшие метрики (в том числе делистингованных монет) не сохраняем, иначе снимок только растет
+    now = time.time()
+    metrics = [
+        (symbol, days, volatility, DRAWDOWN_CACHE[symbol][days], METRICS_CACHE_TIME.get(symbol, {}).get(days, 0))
+        for symbol, periods in VOLATILITY_CACHE.items()
+        for days, volatility in periods.items()
+        if days in DRAWDOWN_CACHE.get(symbol, {})
+        and now - METRICS_CACHE_TIME.get(symbol, {}).get(days, 0) < CACHE_DURATION
+    ]
+    try:
+        await asyncio.to_thread(save_snapshot, SNAPSHOT_PATH, coins, LAST_CACHE_TIME, metrics, time.time())
+        logger.info(f"Снимок кэша сохранен: {len(coins)} монет, {len(metrics)} метрик")
+    except Exception as e:
+        logger.error(f"Не удалось сохранить снимок кэша {SNAPSHOT_PATH}: {e}")
+        logger.error(traceback.format_exc())
+
+# Периодически сохраняет снимок кэша
+async def run_snapshot_saver():
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        await save_warm_snapshot()
+
+# Один раз сообщает, сколько прошло от запуска процесса до первого обслуженного запроса
+def report_first_request():
+    global FIRST_REQUEST_REPORTED
+    if not FIRST_REQUEST_REPORTED:
+        FIRST_REQUEST_REPORTED = True
+        logger.info(f"Первый запрос обслужен через {time.monotonic() - PROCESS_START_TIME:.2f} с после запуска процесса")
+
+# Таблица для HTTP API из кэша процесса: (версия данных, строки). Строки пересобираются
+# только при изменении версии.
+def get_api_table(kind, days):
+    # base/quote берутся из индекса инструментов, поэтому его обновление тоже меняет версию
+    version = f'{COIN_CACHE_VERSION}:{LAST_CACHE_TIME}:{len(COIN_CACHE)}:{LAST_INSTRUMENTS_TIME}:{len(INSTRUMENT_INDEX)}'
+    if kind == 'metrics':
+        version += f':{METRICS_VERSION}'
+    cached = API_TABLE_CACHE.get((kind, days))
+    if cached and cached[0] == version:
+        return cached
+    
+    rows = []
+    for symbol, coin in COIN_CACHE.items():
+        instrument = INSTRUMENT_INDEX.get(symbol, {})
+        row = {
+            'symbol': symbol,
+            'base': instrument.get('base', ''),
+            'quote': instrument.get('quote', ''),
+            'last_price': coin.get('last_price', 0),
+            'volume': coin.get('volume', 0),
+            'turnover': coin.get('turnover', 0),
+            'market_cap': coin.get('market_cap', 0),
+        }
+        if kind == 'metrics':
+            volatility = VOLATILITY_CACHE.get(symbol, {}).get(days)
+            drawdown = DRAWDOWN_CACHE.get(symbol, {}).get(days)
+            if volatility is None or drawdown is None:
+                continue
+            row['volatility'] = volatility
+            row['drawdown'] = drawdown
+            row['updated'] = METRICS_CACHE_TIME.get(symbol, {}).get(days, 0)
+        rows.append(row)
+    API_TABLE_CACHE[(kind, days)] = (version, rows)
+    return version, rows
+
+# Запускает локальный HTTP API рядом с ботом (в процессе, который владеет кэшем)
+async def start_http_api():
+    global HTTP_API_RUNNER
+    if not HTTP_API_PORT:
+        return
+    try:
+        HTTP_API_RUNNER = web.AppRunner(create_api_app(get_api_table, ANALYSIS_PERIODS))
+        await HTTP_API_RUNNER.setup()
+        await web.TCPSite(HTTP_API_RUNNER, HTTP_API_HOST, HTTP_API_PORT).start()
+        logger.info(f"HTTP API доступен на http://{HTTP_API_HOST}:{HTTP_API_PORT}/api/")
+    except Exception as e:
+        logger.error(f"Не удалось запустить HTTP API: {e}")
+        logger.error(traceback.format_exc())
+
+async def stop_http_api():
+    if HTTP_API_RUNNER:
+        await HTTP_API_RUNNER.cleanup()
+
+# Источник рыночных данных внутри текущего процесса (режим single и процесс-воркер)
+class LocalMarketData:
+    def __init__(self, session):
+        self.session = session
+
+    async def get_coins(self):
+        return await get_coins(self.session)
+
+    async def get_instruments(self):
+        return await get_instruments(self.session)
+
+    async def calculate_metrics_batch(self, symbols, days, max_age=None):
+        tasks = [calculate_metrics(self.session, symbol, days, max_age) for symbol in symbols]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get_candles_batch(self, symbols, days, interval):
+        tasks = [get_candles(self.session, symbol, days, interval) for symbol in symbols]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get_rank(self, symbol, days):
+        return RANKINGS.lookup(symbol, days)
+
+# Клиент процесса-воркера рыночных данных (режим frontend)
+class RemoteMarketData:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        for attempt in range(1, MARKET_DATA_CONNECT_ATTEMPTS + 1):
+            try:
+                self.reader, self.writer = await asyncio.open_connection(
+                    self.host, self.port, limit=MARKET_DATA_STREAM_LIMIT
+                )
+                return
+            except OSError as e:
+                if attempt == MARKET_DATA_CONNECT_ATTEMPTS:
+                    raise
+                logger.warning(f"Воркер рыночных данных недоступен ({e}), повтор {attempt}/{MARKET_DATA_CONNECT_ATTEMPTS}")
+                await asyncio.sleep(0.5)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+
+    async def request(self, payload):
+        # Запросы в одном соединении выполняются строго по очереди: одна строка JSON — один ответ
+        async with self.lock:
+            self.writer.write(json.dumps(payload).encode() + b'\n')
+            await self.writer.drain()
+            line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Воркер рыночных данных закрыл соединение")
+        reply = json.loads(line)
+        if 'error' in reply:
+            raise RuntimeError(f"Ошибка воркера рыночных данных: {reply['error']}")
+        return reply['result']
+
+    async def get_coins(self):
+        return await self.request({'op': 'coins'})
+
+    async def get_instruments(self):
+        return await self.request({'op': 'instruments'})
+
+    async def calculate_metrics_batch(self, symbols, days, max_age=None):
+        results = await self.request({'op': 'metrics', 'symbols': list(symbols), 'days': days, 'max_age': max_age})
+        return [tuple(res) if res else (None, None) for res in results]
+
+    async def get_candles_batch(self, symbols, days, interval):
+        results = await self.request({'op': 'candles', 'symbols': list(symbols), 'days': days, 'interval': interval})
+        return [(array('q', res[0]), array('d', res[1])) if res else None for res in results]
+
+    async def get_rank(self, symbol, days):
+        result = await self.request({'op': 'rank', 'symbol': symbol, 'days': days})
+        return {metric: tuple(value) for metric, value in result.items()} if result else None
+
+# Открывает источник рыночных данных в зависимости от режима работы
+@asynccontextmanager
+async def open_market_data():
+    if MARKET_DATA_MODE == 'frontend':
+        market = RemoteMarketData(MARKET_DATA_HOST, MARKET_DATA_PORT)
+        await market.connect()
+        try:
+            yield market
+        finally:
+            await market.close()
+    else:
+        async with open_http_session() as session:
+            yield LocalMarketData(session)
+
+# HTTP-сессия для запросов к Bybit: обычная, с записью трафика или с воспроизведением записи
+@asynccontextmanager
+async def open_http_session():
+    global TRAFFIC_RECORDER, TRAFFIC_REPLAY
+    if TRAFFIC_REPLAY_PATH:
+        if TRAFFIC_REPLAY is None:
+            TRAFFIC_REPLAY = ReplaySession(TRAFFIC_REPLAY_PATH, TRAFFIC_REPLAY_SPEED)
+            logger.info(f"Воспроизведение {len(TRAFFIC_REPLAY)} записанных запросов из {TRAFFIC_REPLAY_PATH}, скорость x{TRAFFIC_REPLAY_SPEED:g}")
+        yield TRAFFIC_REPLAY
+        return
+    async with aiohttp.ClientSession() as session:
+        if TRAFFIC_RECORD_PATH:
+            if TRAFFIC_RECORDER is None:
+                TRAFFIC_RECORDER = TrafficRecorder(TRAFFIC_RECORD_PATH)
+                logger.info(f"Запись трафика Bybit в {TRAFFIC_RECORD_PATH}")
+            yield RecordingSession(session, TRAFFIC_RECORDER)
+        else:
+            yield session
+
+async def close_traffic_recording():
+    if TRAFFIC_RECORDER:
+        # Дожидаемся потока-писателя вне цикла событий
+        try:
+            await asyncio.to_thread(TRAFFIC_RECORDER.close)
+            logger.info(f"Записано {TRAFFIC_RECORDER.count} запросов в {TRAFFIC_RECORD_PATH}")
+        except Exception as e:
+            logger.error(f"Ошибка при записи трафика в {TRAFFIC_RECORD_PATH}: {e}")
+            logger.error(traceback.format_exc())
+    if TRAFFIC_REPLAY:
+        logger.info(f"Воспроизведено {TRAFFIC_REPLAY.served} запросов, без записи: {TRAFFIC_REPLAY.missed}")
+
+# Обработчик одного подключения фронтенда к воркеру рыночных данных
+async def handle_market_data_client(reader, writer, market):
+    peer = writer.get_extra_info('peername')
+    logger.info(f"Подключился фронтенд {peer}")
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                report_first_request()
+                request = json.loads(line)
+                op = request.get('op')
+                if op == 'coins':
+                    result = await market.get_coins()
+                elif op == 'instruments':
+                    result = await market.get_instruments()
+                elif op == 'metrics':
+                    batch_results = await market.calculate_metrics_batch(
+                        request['symbols'], int(request['days']), request.get('max_age')
+                    )
+                    result = [None if isinstance(res, Exception) or res == (None, None) else list(res) for res in batch_results]
+                elif op == 'candles':
+                    batch_results = await market.get_candles_batch(request['symbols'], int(request['days']), request['interval'])
+                    result = [None if isinstance(res, Exception) or res is None else [list(res[0]), list(res[1])] for res in batch_results]
+                elif op == 'rank':
+                    result = await market.get_rank(request['symbol'], int(request['days']))
+                else:
+                    raise ValueError(f"неизвестная операция {op!r}")
+                reply = {'result': result}
+            except Exception as e:
+                logger.error(f"Ошибка при обработке запроса фронтенда {peer}: {e}")
+                logger.error(traceback.format_exc())
+                reply = {'error': str(e)}
+            writer.write(json.dumps(reply).encode() + b'\n')
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        logger.warning(f"Соединение с фронтендом {peer} прервано: {e}")
+    finally:
+        writer.close()
+        logger.info(f"Фронтенд {peer} отключился")
+
+async def serve_market_data():
+    # SIGTERM (systemd, docker stop, завершение родительского процесса) останавливает воркер
+    # штатно: со снимком кэша и закрытием записи трафика
+    serve_task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serve_task.cancel)
+    load_warm_snapshot()
+    snapshot_task = asyncio.create_task(run_snapshot_saver())
+    # При воспроизведении фоновые обновления расходовали бы записанные ответы вне сценария профилирования
+    rank_task = None if TRAFFIC_REPLAY_PATH else asyncio.create_task(run_rank_refresher())
+    await start_http_api()
+    try:
+        await serve_market_data_forever()
+    except asyncio.CancelledError:
+        logger.info("Воркер рыночных данных останавливается")
+    finally:
+        snapshot_task.cancel()
+        if rank_task:
+            rank_task.cancel()
+        await stop_http_api()
+        await save_warm_snapshot()
+        await close_traffic_recording()
+
+async def serve_market_data_forever():
+    async with open_http_session() as session:
+        market = LocalMarketData(session)
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_market_data_client(reader, writer, market),
+            MARKET_DATA_HOST, MARKET_DATA_PORT, limit=MARKET_DATA_STREAM_LIMIT
+        )
+        logger.info(f"Воркер рыночных данных слушает {MARKET_DATA_HOST}:{MARKET_DATA_PORT}")
+        async with server:
+            await server.serve_forever()
+
+# Точка входа процесса-воркера: владеет загрузкой, кэшем и расчетом метрик
+# Настройки передаются явно: при запуске через spawn/forkserver глобальные переменные родителя не наследуются
+def run_market_data_worker(cache_backend_url=None, api_port=None, traffic=None, quote_filter=QUOTE_FILTER):
+    global CACHE_BACKEND_URL, HTTP_API_PORT, TRAFFIC_RECORD_PATH, TRAFFIC_REPLAY_PATH, TRAFFIC_REPLAY_SPEED, QUOTE_FILTER
+    QUOTE_FILTER = quote_filter
+    if cache_backend_url:
+        CACHE_BACKEND_URL = cache_backend_url
+    if api_port is not None:
+        HTTP_API_PORT = api_port
+    if traffic:
+        TRAFFIC_RECORD_PATH, TRAFFIC_REPLAY_PATH, TRAFFIC_REPLAY_SPEED = traffic
+    try:
+        asyncio.run(serve_market_data())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"Ошибка в воркере рыночных данных: {e}")
+        logger.error(traceback.format_exc())
+
 # Команда /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user_id = update.effective_user.id
         username = update.effective_user.username or "Неизвестный пользователь"
         logger.info(f"Получена команда /start от {user_id} ({username})")
+        report_first_request()
         
         # Очищаем user_data перед новым выбором
         context.user_data.clear()
@@ -170,7 +800,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.message.reply_text(
-            'Выберите количество монет для анализа (Bybit, все спот пары):',
+            f'Выберите количество монет для анализа (Bybit, {"спот пары к " + QUOTE_FILTER if QUOTE_FILTER else "все спот пары"}):',
             reply_markup=reply_markup
         )
         logger.info(f"Команда /start выполнена успешно для {user_id}")
@@ -260,7 +890,8 @@ async def select_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard = [
             [InlineKeyboardButton("Волатильность", callback_data='volatility')],
             [InlineKeyboardButton("Просадки", callback_data='drawdown')],
-            [InlineKeyboardButton("Волатильность + Просадки", callback_data='both')]
+            [InlineKeyboardButton("Волатильность + Просадки", callback_data='both')],
+            [InlineKeyboardButton("Корреляции и кластеры", callback_data='correlation')]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -278,6 +909,279 @@ async def select_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.message.reply_text('Произошла ошибка. Попробуйте позже или начните заново с команды /start')
         return ConversationHandler.END
 
+# Отбирает num_coins монет по выбранному критерию.
+# Возвращает ([(symbol, coin_info)], instruments) или None, если не удалось получить список монет.
+async def select_universe(market, num_coins, sort_type):
+    # Получаем список монет
+    coins_data = await market.get_coins()
+    if not coins_data:
+        return None
+
+    # Убираем приостановленные и делистингованные инструменты и лишние кросс-пары
+    instruments = await market.get_instruments()
+    coins_data = filter_tradable(coins_data, instruments, QUOTE_FILTER)
+    
+    # Сортируем по выбранному критерию (объем в долларах, объем в количестве или капитализация)
+    sort_key = 'turnover' if sort_type == 'turnover' else ('volume' if sort_type == 'volume' else 'market_cap')
+    sorted_coins = sorted(
+        coins_data.items(),
+        key=lambda x: x[1].get(sort_key, 0),
+        reverse=True
+    )[:num_coins]
+    
+    logger.info(f"Отобрано {len(sorted_coins)} монет для анализа")
+    logger.info(f"Топ-5 анализируемых монет: {[coin[0] for coin in sorted_coins[:5]]}")
+    return sorted_coins, instruments
+
+# Считает метрики монет пачками по METRICS_BATCH_SIZE. Возвращает {symbol: (volatility, drawdown)}
+# только для монет, по которым есть данные; on_progress(processed, total) вызывается после каждой пачки.
+async def collect_metrics(market, symbols, days, max_age=None, on_progress=None):
+    metrics = {}
+    total = len(symbols)
+    for i in range(0, total, METRICS_BATCH_SIZE):
+        batch = symbols[i:i + METRICS_BATCH_SIZE]
+        batch_results = await market.calculate_metrics_batch(batch, days, max_age)
+        for symbol, res in zip(batch, batch_results):
+            if isinstance(res, Exception) or res == (None, None):
+                logger.warning(f"Не удалось получить метрики для {symbol}: {res if isinstance(res, Exception) else 'Нет данных'}")
+                continue
+            metrics[symbol] = tuple(res)
+        if on_progress:
+            await on_progress(min(i + METRICS_BATCH_SIZE, total), total)
+    return metrics
+
+# Отбирает монеты, рассчитывает для них метрики и сортирует результаты.
+# Возвращает None, если не удалось получить список монет.
+# on_progress(processed, total) вызывается после каждой пачки монет.
+async def run_analysis(market, num_coins, days, sort_type, sort_by, on_progress=None):
+    universe = await select_universe(market, num_coins, sort_type)
+    if universe is None:
+        return None
+    sorted_coins, instruments = universe
+    
+    metrics = await collect_metrics(market, [symbol for symbol, _ in sorted_coins], days, on_progress=on_progress)
+    results = []
+    for symbol, coin_info in sorted_coins:
+        if symbol not in metrics:
+            continue
+        volatility, drawdown = metrics[symbol]
+        base_currency, quote_currency = split_symbol(symbol, instruments)
+        results.append({
+            'symbol': symbol,
+            'base': base_currency,
+            'quote': quote_currency,
+            'tick_size': instruments.get(symbol, {}).get('tick_size', ''),
+            'volatility': volatility,
+            'drawdown': drawdown,
+            'volume': coin_info.get('volume', 0),
+            'turnover': coin_info.get('turnover', 0),
+            'market_cap': coin_info.get('market_cap', 0),
+            'last_price': coin_info.get('last_price', 0)
+        })
+    
+    # Свежие метрики анализа тоже проверяем по подпискам на уведомления
+    check_alerts(days, metrics)
+    sort_results(results, sort_by)
+    return results
+
+# Сортировка результатов по выбранному критерию
+def sort_results(results, sort_by):
+    if not results:
+        return results
+    if sort_by == 'volatility':
+        results.sort(key=lambda x: x['volatility'], reverse=True)
+    elif sort_by == 'drawdown':
+        results.sort(key=lambda x: x['drawdown'], reverse=True)
+    else:  # both
+        # Сортировка по сумме нормализованных значений
+        max_vol = max(r['volatility'] for r in results) or 1
+        max_draw = max(r['drawdown'] for r in results) or 1
+        results.sort(
+            key=lambda x: (x['volatility'] / max_vol + x['drawdown'] / max_draw),
+            reverse=True
+        )
+    return results
+
+# Текстовые подписи выбранных критериев отбора и сортировки
+def describe_sort(sort_type, sort_by):
+    sort_type_text = "объему торгов в USD" if sort_type == "turnover" else ("объему (количество)" if sort_type == "volume" else "капитализации")
+    sort_result_text = "волатильности" if sort_by == "volatility" else ("просадкам" if sort_by == "drawdown" else "волатильности+просадкам")
+    return sort_type_text, sort_result_text
+
+# Заголовок результатов анализа
+def format_results_header(results, days, sort_type, sort_by):
+    sort_type_text, sort_result_text = describe_sort(sort_type, sort_by)
+    message = f'🔍 Анализ {len(results)} монет за {days} дней\n'
+    message += f'📊 Монеты отобраны по {sort_type_text}\n'
+    message += f'🔢 Результаты отсортированы по {sort_result_text}\n\n'
+    return message
+
+# Строки одной монеты в результатах
+def format_coin(i, coin):
+    # Форматируем данные для удобства чтения
+    turnover_formatted = format_number(coin['turnover'])
+    price_formatted = format_price(coin['last_price'], coin['tick_size'])
+    
+    # Создаем более форматированный вывод
+    message = f"{i}. {coin['base']}/{coin['quote']}\n"
+    message += f"   💰 Цена: {price_formatted}\n"
+    message += f"   📈 Волатильность: {coin['volatility']}%\n"
+    message += f"   📉 Просадка: {coin['drawdown']}%\n"
+    message += f"   💵 Объем 24ч: ${turnover_formatted}\n"
+    return message
+
+# Формирует текст результатов, разбитый на сообщения не длиннее ~3500 символов
+def format_results(results, days, sort_type, sort_by):
+    messages = []
+    message = format_results_header(results, days, sort_type, sort_by)
+    
+    for i, coin in enumerate(results, 1):
+        message += format_coin(i, coin)
+        if len(message) > 3500:
+            messages.append(message)
+            message = ""
+    
+    if message:
+        messages.append(message)
+    return messages
+
+# Сохраняет отсортированные результаты на сервере для постраничного просмотра, возвращает их id
+def store_results(results, days, sort_type, sort_by):
+    now = time.time()
+    for result_id in [rid for rid, entry in RESULT_STORE.items() if now - entry['created'] > RESULT_TTL]:
+        del RESULT_STORE[result_id]
+    result_id = secrets.token_urlsafe(6)
+    RESULT_STORE[result_id] = {
+        'results': results,
+        'days': days,
+        'sort_type': sort_type,
+        'sort_by': sort_by,
+        'created': now
+    }
+    return result_id
+
+# Отрисовывает одну страницу сохраненных результатов с кнопками листания и пересортировки
+def render_results_page(result_id, page):
+    entry = RESULT_STORE[result_id]
+    results = entry['results']
+    total_pages = max(1, (len(results) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE)
+    page = max(0, min(page, total_pages - 1))
+    start_index = page * RESULTS_PER_PAGE
+    
+    message = format_results_header(results, entry['days'], entry['sort_type'], entry['sort_by'])
+    for i, coin in enumerate(results[start_index:start_index + RESULTS_PER_PAGE], start_index + 1):
+        message += format_coin(i, coin)
+    message += "\nНовый анализ: /start"
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("◀", callback_data=f'res:{result_id}:page:{page - 1}' if page > 0 else 'res:noop'),
+            InlineKeyboardButton(f"{page + 1}/{total_pages}", callback_data='res:noop'),
+            InlineKeyboardButton("▶", callback_data=f'res:{result_id}:page:{page + 1}' if page < total_pages - 1 else 'res:noop'),
+        ],
+        [
+            InlineKeyboardButton(("✅ " if entry['sort_by'] == key else "") + title, callback_data=f'res:{result_id}:sort:{key}')
+            for key, title in (('volatility', 'Волатильность'), ('drawdown', 'Просадки'), ('both', 'Оба'))
+        ],
+        [
+            InlineKeyboardButton(title, callback_data=f'res:{result_id}:file:{kind}')
+            for kind, title in (('chart', '📊 График'), ('csv', '📄 CSV'), ('xlsx', '📗 Excel'))
+        ]
+    ]
+    return message, InlineKeyboardMarkup(keyboard)
+
+def get_report_file_pool():
+    global REPORT_FILE_POOL
+    if REPORT_FILE_POOL is None:
+        # fork из многопоточного процесса (пул потоков asyncio, SQLite) может зависнуть,
+        # поэтому процессы запускаются через forkserver: функции отрисовки принимают только простые данные
+        REPORT_FILE_POOL = ProcessPoolExecutor(
+            max_workers=REPORT_FILE_WORKERS, mp_context=multiprocessing.get_context('forkserver')
+        )
+    return REPORT_FILE_POOL
+
+# Ключ отчета: параметры и содержимое результатов. Одинаковые отчеты (повторный запрос,
+# рассылка по подпискам) рисуются один раз, параллельные запросы ждут одну и ту же отрисовку.
+def report_file_key(results, days, sort_type, sort_by):
+    content = tuple((coin['symbol'], coin['volatility'], coin['drawdown'], coin['turnover']) for coin in results)
+    return days, sort_type, sort_by, hash(content)
+
+# Возвращает (bytes, имя файла) для типа 'chart', 'csv' или 'xlsx'
+async def build_report_file(kind, results, days, sort_type, sort_by):
+    now = time.time()
+    for key in [k for k, (created, _) in REPORT_FILE_CACHE.items() if now - created > REPORT_FILE_TTL]:
+        del REPORT_FILE_CACHE[key]
+    
+    key = (report_file_key(results, days, sort_type, sort_by), kind)
+    if key not in REPORT_FILE_CACHE:
+        sort_type_text, sort_result_text = describe_sort(sort_type, sort_by)
+        title = f'{len(results)} монет за {days} дн., отбор по {sort_type_text}, сортировка по {sort_result_text}'
+        future = asyncio.get_running_loop().run_in_executor(
+            get_report_file_pool(), render_report_file, kind, results, title
+        )
+        REPORT_FILE_CACHE[key] = (now, future)
+    try:
+        data, extension = await REPORT_FILE_CACHE[key][1]
+    except Exception:
+        REPORT_FILE_CACHE.pop(key, None)
+        raise
+    return data, f'volatility_{days}d_{sort_by}.{extension}'
+
+# Отправляет график или файл с сохраненными результатами в ответ на сообщение
+async def send_result_file(message, entry, kind):
+    try:
+        data, filename = await build_report_file(kind, entry['results'], entry['days'], entry['sort_type'], entry['sort_by'])
+        if kind == 'chart':
+            await message.reply_photo(photo=data)
+        else:
+            await message.reply_document(document=data, filename=filename)
+    except ImportError as e:
+        logger.error(f"Не установлен пакет для графиков: {e}")
+        await message.reply_text('Графики недоступны: на сервере не установлен matplotlib.')
+    except Exception as e:
+        logger.error(f"Ошибка при подготовке файла {kind}: {e}")
+        logger.error(traceback.format_exc())
+        await message.reply_text('Не удалось подготовить файл. Попробуйте позже.')
+
+# Обработчик кнопок листания и пересортировки результатов (данные не запрашиваются заново)
+async def browse_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    try:
+        parts = query.data.split(':')
+        if len(parts) != 4:
+            await query.answer()
+            return
+        _, result_id, action, value = parts
+        entry = RESULT_STORE.get(result_id)
+        if entry is None or time.time() - entry['created'] > RESULT_TTL:
+            RESULT_STORE.pop(result_id, None)
+            await query.answer('Результаты устарели. Запустите новый анализ: /start', show_alert=True)
+            return
+        
+        if action == 'file' and value in ('chart', 'csv', 'xlsx'):
+            await query.answer('Готовлю файл...')
+            await send_result_file(query.message, entry, value)
+            return
+        
+        page = 0
+        if action == 'page':
+            page = int(value)
+        elif action == 'sort' and value in ('volatility', 'drawdown', 'both'):
+            if entry['sort_by'] != value:
+                sort_results(entry['results'], value)
+                entry['sort_by'] = value
+        
+        await query.answer()
+        message, reply_markup = render_results_page(result_id, page)
+        await query.message.edit_text(message, reply_markup=reply_markup)
+    except BadRequest as e:
+        # Telegram отклоняет редактирование, если текст и кнопки не изменились
+        if 'not modified' not in str(e).lower():
+            logger.warning(f"Не удалось обновить страницу результатов: {e}")
+    except Exception as e:
+        logger.error(f"Ошибка в browse_results: {e}")
+        logger.error(traceback.format_exc())
+
 # Обработчик сортировки и вывода результатов
 async def show_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -297,139 +1201,47 @@ async def show_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f'Анализ {num_coins} монет за {days} дней...\n{get_progress_bar(0, num_coins)}'
         )
         
-        async with aiohttp.ClientSession() as session:
-            # Получаем список монет
-            coins_data = await get_coins(session)
-            if not coins_data:
-                await query.message.reply_text('Не удалось получить список монет. Попробуйте позже.')
-                await progress_message.delete()
-                logger.error(f"Список монет пуст для пользователя {user_id}")
-                return ConversationHandler.END
-
-            # Сортируем по выбранному критерию (объем в долларах, объем в количестве или капитализация)
-            sort_key = 'turnover' if sort_type == 'turnover' else ('volume' if sort_type == 'volume' else 'market_cap')
-            sorted_coins = sorted(
-                coins_data.items(),
-                key=lambda x: x[1].get(sort_key, 0),
-                reverse=True
-            )[:num_coins]
-            
-            logger.info(f"Отобрано {len(sorted_coins)} монет для анализа")
-            logger.info(f"Топ-5 анализируемых монет: {[coin[0] for coin in sorted_coins[:5]]}")
-            
-            results = []
-            total_coins = len(sorted_coins)
-            batch_size = 10  # Обрабатываем по 10 монет за раз
-            
-            for i in range(0, total_coins, batch_size):
-                batch = sorted_coins[i:i + batch_size]
-                tasks = [calculate_metrics(session, symbol, days) for symbol, _ in batch]
-                batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                for (symbol, coin_info), res in zip(batch, batch_results):
-                    if isinstance(res, Exception) or res == (None, None):
-                        logger.warning(f"Не удалось получить метрики для {symbol}: {res if isinstance(res, Exception) else 'Нет данных'}")
-                        continue
-                    volatility, drawdown = res
-                    results.append({
-                        'symbol': symbol,
-                        'volatility': volatility,
-                        'drawdown': drawdown,
-                        'volume': coin_info.get('volume', 0),
-                        'turnover': coin_info.get('turnover', 0),
-                        'market_cap': coin_info.get('market_cap', 0),
-                        'last_price': coin_info.get('last_price', 0)
-                    })
-                
-                # Обновляем прогресс-бар
-                processed = min(i + batch_size, total_coins)
-                try:
-                    await progress_message.edit_text(
-                        f'Анализ {num_coins} монет за {days} дней...\n{get_progress_bar(processed, total_coins)}'
-                    )
-                except Exception as e:
-                    logger.warning(f"Не удалось обновить прогресс-бар: {e}")
-                await asyncio.sleep(0.1)
-            
-            if not results:
-                await query.message.reply_text('Не удалось выполнить анализ. Попробуйте позже.')
-                try:
-                    await progress_message.delete()
-                except Exception:
-                    pass
-                logger.error(f"Результаты анализа пусты для пользователя {user_id}")
-                return ConversationHandler.END
-
-            # Сортировка по выбранному критерию
-            if sort_by == 'volatility':
-                results.sort(key=lambda x: x['volatility'], reverse=True)
-            elif sort_by == 'drawdown':
-                results.sort(key=lambda x: x['drawdown'], reverse=True)
-            else:  # both
-                # Сортировка по сумме нормализованных значений
-                max_vol = max(r['volatility'] for r in results) or 1
-                max_draw = max(r['drawdown'] for r in results) or 1
-                results.sort(
-                    key=lambda x: (x['volatility'] / max_vol + x['drawdown'] / max_draw),
-                    reverse=True
+        # Обновляем прогресс-бар
+        async def update_progress(processed, total_coins):
+            try:
+                await progress_message.edit_text(
+                    f'Анализ {num_coins} монет за {days} дней...\n{get_progress_bar(processed, total_coins)}'
                 )
-
-            # Формируем сообщение
-            sort_type_text = "объему торгов в USD" if sort_type == "turnover" else ("объему (количество)" if sort_type == "volume" else "капитализации")
-            sort_result_text = "волатильности" if sort_by == "volatility" else ("просадкам" if sort_by == "drawdown" else "волатильности+просадкам")
-            
-            message = f'🔍 Анализ {len(results)} монет за {days} дней\n'
-            message += f'📊 Монеты отобраны по {sort_type_text}\n'
-            message += f'🔢 Результаты отсортированы по {sort_result_text}\n\n'
-            
-            for i, coin in enumerate(results, 1):
-                # Форматируем данные для удобства чтения
-                volume_formatted = format_number(coin['volume'])
-                turnover_formatted = format_number(coin['turnover'])
-                market_cap_formatted = format_number(coin['market_cap']) if coin['market_cap'] > 0 else "N/A"
-                price_formatted = f"${coin['last_price']:.4f}" if coin['last_price'] < 1 else f"${coin['last_price']:.2f}"
-                
-                # Получаем базовую и котируемую валюты
-                symbol_parts = coin['symbol'].split('USDT')
-                base_currency = symbol_parts[0]
-                quote_currency = "USDT"
-                if len(symbol_parts) == 1 or not symbol_parts[0]:
-                    # Если не USDT пара, пробуем другие варианты
-                    for quote in ["BTC", "ETH", "USD", "EUR"]:
-                        if quote in coin['symbol']:
-                            parts = coin['symbol'].split(quote)
-                            if parts[0]:
-                                base_currency = parts[0]
-                                quote_currency = quote
-                                break
-                
-                # Создаем более форматированный вывод
-                message += f"{i}. {base_currency}/{quote_currency}\n"
-                message += f"   💰 Цена: {price_formatted}\n"
-                message += f"   📈 Волатильность: {coin['volatility']}%\n"
-                message += f"   📉 Просадка: {coin['drawdown']}%\n"
-                message += f"   💵 Объем 24ч: ${turnover_formatted}\n"
-                
-                if len(message) > 3500:
-                    await query.message.reply_text(message)
-                    message = ""
-            
-            if message:
-                await query.message.reply_text(message)
-            
+            except Exception as e:
+                logger.warning(f"Не удалось обновить прогресс-бар: {e}")
+            await asyncio.sleep(0.1)
+        
+        async with open_market_data() as market:
+            results = await run_analysis(market, num_coins, days, sort_type, sort_by, update_progress)
+        
+        if results is None:
+            await query.message.reply_text('Не удалось получить список монет. Попробуйте позже.')
+            await progress_message.delete()
+            logger.error(f"Список монет пуст для пользователя {user_id}")
+            return ConversationHandler.END
+        
+        if not results:
+            await query.message.reply_text('Не удалось выполнить анализ. Попробуйте позже.')
             try:
                 await progress_message.delete()
             except Exception:
                 pass
-                
-            logger.info(f"Результаты выведены для пользователя {user_id}: {len(results)} монет")
-            
-            # Предложение начать новый анализ
-            await query.message.reply_text(
-                "Анализ завершен. Чтобы начать новый анализ, используйте команду /start"
-            )
-            
+            logger.error(f"Результаты анализа пусты для пользователя {user_id}")
             return ConversationHandler.END
+
+        # Результаты показываем одним сообщением с листанием: рисуется только видимая страница
+        result_id = store_results(results, days, sort_type, sort_by)
+        message, reply_markup = render_results_page(result_id, 0)
+        await query.message.reply_text(message, reply_markup=reply_markup)
+        
+        try:
+            await progress_message.delete()
+        except Exception:
+            pass
+            
+        logger.info(f"Результаты выведены для пользователя {user_id}: {len(results)} монет")
+        
+        return ConversationHandler.END
     except Exception as e:
         user_id = update.effective_user.id if update and update.effective_user else "Неизвестный"
         logger.error(f"Ошибка в show_results для пользователя {user_id}: {e}")
@@ -441,6 +1253,126 @@ async def show_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pass
         return ConversationHandler.END
 
+# Загружает свечи выбранных монет и считает корреляции и кластеры (с кэшем по набору монет и периоду)
+async def run_correlation_analysis(market, num_coins, days, sort_type, on_progress=None):
+    universe = await select_universe(market, num_coins, sort_type)
+    if universe is None:
+        return None
+    sorted_coins, instruments = universe
+    symbols = [symbol for symbol, _ in sorted_coins]
+    
+    cache_key = (tuple(symbols), days)
+    cached = CORRELATION_CACHE.get(cache_key)
+    if cached and time.time() - cached[0] < CACHE_DURATION:
+        logger.info(f"Используется кэш корреляций для {len(symbols)} монет за {days} дней")
+        return cached[1]
+    
+    interval = CORRELATION_INTERVALS[days]
+    series = {}
+    for i in range(0, len(symbols), METRICS_BATCH_SIZE):
+        batch = symbols[i:i + METRICS_BATCH_SIZE]
+        batch_results = await market.get_candles_batch(batch, days, interval)
+        for symbol, res in zip(batch, batch_results):
+            if isinstance(res, Exception) or res is None:
+                logger.warning(f"Не удалось получить свечи для {symbol}: {res if isinstance(res, Exception) else 'Нет данных'}")
+                continue
+            series[symbol] = res
+        if on_progress:
+            await on_progress(min(i + METRICS_BATCH_SIZE, len(symbols)), len(symbols))
+    
+    # Матрица 500 x 500 считается векторно в отдельном потоке, не блокируя цикл событий
+    result = await asyncio.to_thread(analyze_correlations, series, CORRELATION_TOP_PAIRS, CORRELATION_CLUSTER_THRESHOLD)
+    result['names'] = {symbol: "/".join(split_symbol(symbol, instruments)) for symbol in symbols}
+    now = time.time()
+    for stale_key in [k for k, (calculated, _) in CORRELATION_CACHE.items() if now - calculated >= CACHE_DURATION]:
+        del CORRELATION_CACHE[stale_key]
+    CORRELATION_CACHE[cache_key] = (now, result)
+    return result
+
+# Формирует сообщение с топом коррелирующих пар и кластерами
+def format_correlation(result, days, sort_type):
+    sort_type_text, _ = describe_sort(sort_type, 'volatility')
+    names = result['names']
+    message = f'🔗 Корреляции доходностей {result["coins"]} монет за {days} дней ({result["points"]} свечей)\n'
+    message += f'📊 Монеты отобраны по {sort_type_text}\n\n'
+    if not result['pairs']:
+        return message + 'Недостаточно данных для расчета корреляций.'
+    
+    message += 'Самые коррелирующие пары:\n'
+    for i, (first, second, value) in enumerate(result['pairs'], 1):
+        message += f"{i}. {names.get(first, first)} ↔ {names.get(second, second)}: {value}\n"
+    
+    message += f'\nКластеры (корреляция ≥ {CORRELATION_CLUSTER_THRESHOLD}):\n'
+    if not result['clusters']:
+        message += 'Нет групп монет, движущихся вместе.\n'
+    for i, cluster in enumerate(result['clusters'][:CORRELATION_MAX_CLUSTERS], 1):
+        members = [names.get(symbol, symbol).split('/')[0] for symbol in cluster['symbols']]
+        shown = ", ".join(members[:CORRELATION_CLUSTER_PREVIEW])
+        more = f" и еще {len(members) - CORRELATION_CLUSTER_PREVIEW}" if len(members) > CORRELATION_CLUSTER_PREVIEW else ""
+        message += f"{i}. {len(members)} монет, средняя корреляция {cluster['mean_correlation']}: {shown}{more}\n"
+    if len(result['clusters']) > CORRELATION_MAX_CLUSTERS:
+        message += f"... всего кластеров: {len(result['clusters'])}\n"
+    return message + "\nНовый анализ: /start"
+
+# Обработчик анализа корреляций
+async def show_correlation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    progress_message = None
+    try:
+        user_id = update.effective_user.id
+        await query.answer()
+        
+        num_coins = context.user_data.get('num_coins', 50)
+        days = context.user_data.get('days', 7)
+        sort_type = context.user_data.get('sort_type', 'turnover')
+        logger.info(f"Пользователь {user_id} запустил анализ корреляций {num_coins} монет за {days} дней")
+        
+        progress_message = await query.message.reply_text(
+            f'Анализ корреляций {num_coins} монет за {days} дней...\n{get_progress_bar(0, num_coins)}'
+        )
+        
+        async def update_progress(processed, total_coins):
+            try:
+                await progress_message.edit_text(
+                    f'Анализ корреляций {num_coins} монет за {days} дней...\n{get_progress_bar(processed, total_coins)}'
+                )
+            except Exception as e:
+                logger.warning(f"Не удалось обновить прогресс-бар: {e}")
+        
+        async with open_market_data() as market:
+            result = await run_correlation_analysis(market, num_coins, days, sort_type, update_progress)
+        
+        if result is None:
+            await query.message.reply_text('Не удалось получить список монет. Попробуйте позже.')
+        else:
+            await query.message.reply_text(format_correlation(result, days, sort_type))
+            logger.info(f"Корреляции выведены для пользователя {user_id}: {result['coins']} монет")
+        try:
+            await progress_message.delete()
+        except Exception:
+            pass
+        return ConversationHandler.END
+    except ImportError as e:
+        logger.error(f"Анализ корреляций недоступен: {e}")
+        try:
+            await query.message.reply_text('Анализ корреляций недоступен на этом сервере (не установлен numpy).')
+            if progress_message:
+                await progress_message.delete()
+        except Exception:
+            pass
+        return ConversationHandler.END
+    except Exception as e:
+        user_id = update.effective_user.id if update and update.effective_user else "Неизвестный"
+        logger.error(f"Ошибка в show_correlation для пользователя {user_id}: {e}")
+        logger.error(traceback.format_exc())
+        try:
+            await query.message.reply_text('Произошла ошибка при анализе. Попробуйте позже или начните заново с команды /start')
+            if progress_message:
+                await progress_message.delete()
+        except Exception:
+            pass
+        return ConversationHandler.END
+
 # Функция для форматирования чисел (добавляет разделители и округляет большие числа)
 def format_number(number):
     if number >= 1_000_000_000:  # миллиарды
@@ -452,6 +1384,13 @@ def format_number(number):
     else:
         return f"{number:.2f}"
 
+# Форматирует цену с точностью шага цены инструмента, если он известен
+def format_price(price, tick_size=''):
+    if tick_size:
+        decimals = max(0, -Decimal(tick_size).normalize().as_tuple().exponent)
+        return f"${price:.{decimals}f}"
+    return f"${price:.4f}" if price < 1 else f"${price:.2f}"
+
 # Функция отмены
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
@@ -459,9 +1398,529 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.message.reply_text('Операция отменена. Чтобы начать новый анализ, используйте команду /start')
     return ConversationHandler.END
 
+# Отправка уведомлений с учетом лимитов Telegram: не более rate сообщений в секунду
+# всего и не чаще одного сообщения в per_chat_interval секунд в один чат.
+# У каждого чата своя очередь, а чаты с готовыми к отправке сообщениями лежат в куче
+# по времени, когда им снова можно писать: пауза одного чата не задерживает остальные.
+class RateLimitedSender:
+    def __init__(self, bot, rate=25, per_chat_interval=1.0):
+        self.bot = bot
+        self.interval = 1 / rate
+        self.per_chat_interval = per_chat_interval
+        self.pending = {}  # {chat_id: deque((method, kwargs))}
+        self.schedule = []  # куча (время, когда можно отправить, порядковый номер, chat_id)
+        self.counter = 0
+        self.wakeup = asyncio.Event()
+        self.last_sent = {}  # {chat_id: время последней отправки}
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    def enqueue(self, chat_id, method, kwargs):
+        queue = self.pending.get(chat_id)
+        if queue is None:
+            queue = self.pending[chat_id] = deque()
+            ready_at = self.last_sent.get(chat_id, 0) + self.per_chat_interval
+            self.push(ready_at, chat_id)
+        queue.append((method, kwargs))
+
+    def push(self, ready_at, chat_id):
+        self.counter += 1
+        heapq.heappush(self.schedule, (ready_at, self.counter, chat_id))
+        self.wakeup.set()
+
+    def send(self, chat_id, text, **kwargs):
+        self.enqueue(chat_id, 'send_message', dict(text=text, **kwargs))
+
+    # Один файл нескольким чатам: загружается в Telegram один раз, остальные чаты получают его file_id
+    def send_document(self, chat_ids, document, filename):
+        upload = dict(document=document, filename=filename)
+        for chat_id in chat_ids:
+            self.enqueue(chat_id, 'send_document', upload)
+
+    async def deliver(self, chat_id, method, kwargs):
+        for attempt in range(3):
+            try:
+                message = await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+                # Общий для всех чатов словарь: следующие отправки ссылаются на уже загруженный файл
+                if method == 'send_document' and 'filename' in kwargs and message and message.document:
+                    kwargs['document'] = message.document.file_id
+                    del kwargs['filename']
+                return
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+                logger.warning(f"Превышен лимит Telegram, пауза {retry_after} с")
+                await asyncio.sleep(retry_after)
+            except Forbidden:
+                logger.warning(f"Чат {chat_id} недоступен, сообщение пропущено")
+                return
+            except Exception as e:
+                logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
+                return
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            if not self.schedule:
+                await self.wakeup.wait()
+                continue
+            ready_at, _, chat_id = self.schedule[0]
+            wait = ready_at - time.monotonic()
+            if wait > 0:
+                # Ждем своей очереди, но просыпаемся раньше, если появился чат, которому можно писать сейчас
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.schedule)
+            queue = self.pending[chat_id]
+            method, kwargs = queue.popleft()
+            await self.deliver(chat_id, method, kwargs)
+            self.last_sent[chat_id] = time.monotonic()
+            if queue:
+                self.push(self.last_sent[chat_id] + self.per_chat_interval, chat_id)
+            else:
+                del self.pending[chat_id]
+            await asyncio.sleep(self.interval)
+
+# Проверяет подписки по свежим метрикам монеты и добавляет строки уведомлений в lines_by_chat
+def evaluate_alerts(symbol, days, volatility, drawdown, lines_by_chat):
+    for alert, value in ALERTS.evaluate(symbol, days, volatility, drawdown):
+        metric_text = "Волатильность" if alert.metric == 'volatility' else "Просадка"
+        lines_by_chat.setdefault(alert.chat_id, []).append(
+            f"🔔 {symbol}: {metric_text} за {alert.days} дн. = {value}% ({alert.op} {alert.threshold:g}%, подписка #{alert.id})"
+        )
+
+# Проверяет подписки по метрикам {symbol: (volatility, drawdown)}, полученным вне прохода refresh_alerts
+# (анализ, обновление рейтинга). Уведомления отправляет только процесс, в котором работает бот.
+def check_alerts(days, metrics):
+    if NOTIFIER is None or not len(ALERTS):
+        return
+    lines_by_chat = {}
+    for symbol, (volatility, drawdown) in metrics.items():
+        evaluate_alerts(symbol, days, volatility, drawdown, lines_by_chat)
+    send_alert_messages(lines_by_chat)
+
+# Все сработавшие за проход подписки одного чата отправляем одним сообщением
+# (или несколькими, если текст не помещается в ~3500 символов)
+def send_alert_messages(lines_by_chat):
+    for chat_id, lines in lines_by_chat.items():
+        message = ""
+        for line in lines:
+            if message and len(message) + len(line) > 3500:
+                NOTIFIER.send(chat_id, message)
+                message = ""
+            message += line + "\n"
+        if message:
+            NOTIFIER.send(chat_id, message)
+
+# Обновляет метрики монет, на которые есть подписки, и проверяет пороги.
+# Метрики старше ALERT_REFRESH_INTERVAL пересчитываются, чтобы проверка действительно шла с этим интервалом.
+async def refresh_alerts():
+    targets = ALERTS.targets()
+    if not targets:
+        return
+    async with open_market_data() as market:
+        universe = []
+        if any(has_any for _, has_any in targets.values()):
+            coins_data = filter_tradable(await market.get_coins(), await market.get_instruments(), QUOTE_FILTER)
+            universe = [symbol for symbol, _ in sorted(
+                coins_data.items(), key=lambda x: x[1].get('turnover', 0), reverse=True
+            )[:ALERT_UNIVERSE_SIZE]]
+        lines_by_chat = {}
+        for days, (symbols, has_any) in targets.items():
+            symbols = sorted(symbols | set(universe)) if has_any else sorted(symbols)
+            metrics = await collect_metrics(market, symbols, days, ALERT_REFRESH_INTERVAL)
+            for symbol, (volatility, drawdown) in metrics.items():
+                evaluate_alerts(symbol, days, volatility, drawdown, lines_by_chat)
+        send_alert_messages(lines_by_chat)
+    logger.info(f"Проверены подписки на уведомления: {len(ALERTS)}")
+
+async def run_alert_refresher():
+    while True:
+        try:
+            await refresh_alerts()
+        except Exception as e:
+            logger.error(f"Ошибка при проверке подписок на уведомления: {e}")
+            logger.error(traceback.format_exc())
+        await asyncio.sleep(ALERT_REFRESH_INTERVAL)
+
+# Команда /alert SYMBOL|any volatility|drawdown >|< X [дни]
+async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        user_id = update.effective_user.id
+        report_first_request()
+        args = context.args
+        usage = (
+            'Использование: /alert SYMBOL|any volatility|drawdown >|< X [дни]\n'
+            'Например: /alert BTCUSDT volatility > 5 или /alert any drawdown > 20 7'
+        )
+        if len(args) not in (4, 5):
+            await update.message.reply_text(usage)
+            return
+        symbol = None if args[0].lower() == 'any' else args[0].upper()
+        metric = ALERT_METRIC_ALIASES.get(args[1].lower())
+        op = args[2]
+        try:
+            threshold = float(args[3].rstrip('%').replace(',', '.'))
+            days = int(args[4]) if len(args) == 5 else 1
+        except ValueError:
+            await update.message.reply_text(usage)
+            return
+        if metric is None or op not in ('>', '<') or days not in ANALYSIS_PERIODS:
+            await update.message.reply_text(usage + f'\nДоступные периоды: {", ".join(map(str, ANALYSIS_PERIODS))} дн.')
+            return
+        note = ''
+        if symbol:
+            async with open_market_data() as market:
+                instruments = await market.get_instruments()
+            if not instruments:
+                note = 'Не удалось проверить, что пара торгуется на Bybit: список инструментов недоступен.\n'
+            elif symbol not in instruments:
+                await update.message.reply_text(f'Пара {symbol} не найдена на Bybit (спот).')
+                return
+        alert = ALERTS.add(update.effective_chat.id, symbol, metric, op, threshold, days)
+        logger.info(f"Пользователь {user_id} подписался на уведомление #{alert.id}: {args}")
+        await update.message.reply_text(
+            note + f'Подписка #{alert.id} создана: {symbol or "любая монета"}, {args[1]} за {days} дн. {op} {threshold:g}%.\n'
+            f'Проверка раз в {ALERT_REFRESH_INTERVAL // 60} мин и при каждом новом расчете метрик. Список подписок: /alerts'
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в /alert: {e}")
+        logger.error(traceback.format_exc())
+        await update.message.reply_text('Произошла ошибка. Попробуйте позже.')
+
+# Команда /alerts — список подписок чата
+async def list_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    alerts = ALERTS.for_chat(update.effective_chat.id)
+    if not alerts:
+        await update.message.reply_text('Подписок нет. Создать: /alert SYMBOL|any volatility|drawdown > X [дни]')
+        return
+    lines = [
+        f"#{alert.id}: {alert.symbol or 'любая монета'} {alert.metric} за {alert.days} дн. {alert.op} {alert.threshold:g}%"
+        for alert in alerts
+    ]
+    await update.message.reply_text("\n".join(lines) + "\n\nУдалить: /unalert ID")
+
+# Команда /unalert ID — удаление подписки
+async def remove_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        alert_id = int(context.args[0].lstrip('#'))
+    except (IndexError, ValueError):
+        await update.message.reply_text('Использование: /unalert ID')
+        return
+    if ALERTS.remove(alert_id, update.effective_chat.id):
+        await update.message.reply_text(f'Подписка #{alert_id} удалена.')
+    else:
+        await update.message.reply_text(f'Подписка #{alert_id} не найдена.')
+
+# Рассылает отчеты, время которых наступило: каждая конфигурация считается один раз
+# и отправляется всем подписанным чатам через очередь с учетом лимитов Telegram
+async def send_scheduled_reports(slot):
+    groups = REPORTS.due(slot)
+    if not groups:
+        return
+    logger.info(f"Рассылка отчетов {slot}: {len(groups)} конфигураций, {sum(len(c) for c in groups.values())} чатов")
+    async with open_market_data() as market:
+        for (num_coins, sort_type, days, sort_by), chat_ids in groups.items():
+            try:
+                results = await run_analysis(market, num_coins, days, sort_type, sort_by)
+            except Exception as e:
+                logger.error(f"Ошибка при расчете отчета {num_coins}/{sort_type}/{days}/{sort_by}: {e}")
+                logger.error(traceback.format_exc())
+                results = None
+            document = None
+            if not results:
+                messages = ['Не удалось подготовить регулярный отчет. Попробуем в следующий раз.']
+            else:
+                messages = format_results(results, days, sort_type, sort_by)
+            # Большой отчет: вместо пачки сообщений — начало списка и один файл со всеми монетами
+            if len(messages) > 1:
+                try:
+                    document = await build_report_file('xlsx', results, days, sort_type, sort_by)
+                    message = format_results_header(results, days, sort_type, sort_by)
+                    for i, coin in enumerate(results[:RESULTS_PER_PAGE], 1):
+                        message += format_coin(i, coin)
+                    messages = [message + f"\nПолный список из {len(results)} монет — в файле."]
+                except Exception as e:
+                    logger.error(f"Не удалось подготовить файл отчета: {e}")
+                    logger.error(traceback.format_exc())
+            for chat_id in chat_ids:
+                for message in messages:
+                    NOTIFIER.send(chat_id, message)
+            if document:
+                NOTIFIER.send_document(chat_ids, document[0], document[1])
+
+# Раз в REPORT_CHECK_INTERVAL секунд проверяет, не наступило ли время очередного отчета (UTC).
+# Если рассылка заняла больше минуты, пропущенные минуты обрабатываются следом, а не теряются.
+async def run_report_scheduler():
+    last_minute = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=1)
+    while True:
+        now_minute = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        # Догоняем не больше суток: дальше слоты ЧЧ:ММ начали бы повторяться
+        last_minute = max(last_minute, now_minute - timedelta(days=1))
+        while last_minute < now_minute:
+            last_minute += timedelta(minutes=1)
+            try:
+                await send_scheduled_reports(last_minute.strftime('%H:%M'))
+            except Exception as e:
+                logger.error(f"Ошибка при рассылке отчетов: {e}")
+                logger.error(traceback.format_exc())
+        await asyncio.sleep(REPORT_CHECK_INTERVAL)
+
+# Команда /subscribe КОЛИЧЕСТВО turnover|volume|marketcap ДНИ volatility|drawdown|both ЧЧ:ММ
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        user_id = update.effective_user.id
+        report_first_request()
+        args = context.args
+        usage = (
+            'Использование: /subscribe КОЛИЧЕСТВО turnover|volume|marketcap ДНИ volatility|drawdown|both ЧЧ:ММ\n'
+            'Например: /subscribe 100 turnover 1 volatility 09:00 — ежедневно в 09:00 UTC'
+        )
+        if len(args) != 5:
+            await update.message.reply_text(usage)
+            return
+        try:
+            num_coins = int(args[0])
+            days = int(args[2])
+            send_time = datetime.strptime(args[4], '%H:%M').strftime('%H:%M')
+        except ValueError:
+            await update.message.reply_text(usage)
+            return
+        sort_type, sort_by = args[1].lower(), args[3].lower()
+        if (num_coins not in REPORT_COIN_COUNTS or sort_type not in ('turnover', 'volume', 'marketcap')
+                or days not in ANALYSIS_PERIODS or sort_by not in ('volatility', 'drawdown', 'both')):
+            await update.message.reply_text(
+                usage + f'\nКоличество монет: {", ".join(map(str, REPORT_COIN_COUNTS))}; '
+                f'периоды: {", ".join(map(str, ANALYSIS_PERIODS))} дн.'
+            )
+            return
+        subscription = REPORTS.add(update.effective_chat.id, num_coins, sort_type, days, sort_by, send_time)
+        logger.info(f"Пользователь {user_id} подписался на отчет #{subscription.id}: {args}")
+        await update.message.reply_text(
+            f'Подписка на отчет #{subscription.id} создана: {num_coins} монет по {sort_type}, '
+            f'{days} дн., сортировка по {sort_by}, ежедневно в {send_time} UTC.\nСписок подписок: /subscriptions'
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в /subscribe: {e}")
+        logger.error(traceback.format_exc())
+        await update.message.reply_text('Произошла ошибка. Попробуйте позже.')
+
+# Команда /subscriptions — список подписок чата на отчеты
+async def list_subscriptions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    subscriptions = REPORTS.for_chat(update.effective_chat.id)
+    if not subscriptions:
+        await update.message.reply_text('Подписок на отчеты нет. Создать: /subscribe 100 turnover 1 volatility 09:00')
+        return
+    lines = [
+        f"#{s.id}: {s.num_coins} монет по {s.sort_type}, {s.days} дн., сортировка по {s.sort_by}, в {s.time} UTC"
+        for s in subscriptions
+    ]
+    await update.message.reply_text("\n".join(lines) + "\n\nОтписаться: /unsubscribe ID")
+
+# Команда /unsubscribe ID — удаление подписки на отчет
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        subscription_id = int(context.args[0].lstrip('#'))
+    except (IndexError, ValueError):
+        await update.message.reply_text('Использование: /unsubscribe ID')
+        return
+    if REPORTS.remove(subscription_id, update.effective_chat.id):
+        await update.message.reply_text(f'Подписка на отчет #{subscription_id} удалена.')
+    else:
+        await update.message.reply_text(f'Подписка на отчет #{subscription_id} не найдена.')
+
+# Поддерживает рейтинг: раз в RANK_REFRESH_INTERVAL обновляет метрики топ-монет за все периоды.
+# После прохода рейтинг собирается заново только из монет текущего топа: выбывшие
+# и делистингованные монеты, а также метрики, посчитанные для других целей, в него не попадают.
+async def refresh_rankings():
+    global RANKINGS, RANK_UNIVERSE
+    async with open_market_data() as market:
+        universe = await select_universe(market, RANK_UNIVERSE_SIZE, 'turnover')
+        if universe is None:
+            return
+        symbols = [symbol for symbol, _ in universe[0]]
+        rankings = Rankings()
+        for days in ANALYSIS_PERIODS:
+            metrics = await collect_metrics(market, symbols, days)
+            for symbol, (volatility, drawdown) in metrics.items():
+                rankings.update(symbol, days, volatility, drawdown)
+            check_alerts(days, metrics)
+    RANKINGS = rankings
+    RANK_UNIVERSE = frozenset(symbols)
+    logger.info(f"Рейтинг обновлен: {len(symbols)} монет, периоды {ANALYSIS_PERIODS}")
+
+async def run_rank_refresher():
+    while True:
+        try:
+            await refresh_rankings()
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении рейтинга: {e}")
+            logger.error(traceback.format_exc())
+        await asyncio.sleep(RANK_REFRESH_INTERVAL)
+
+# Команда /rank SYMBOL [дни] — место монеты в рейтинге без новых запросов к Bybit
+async def rank_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        user_id = update.effective_user.id
+        report_first_request()
+        args = context.args
+        usage = 'Использование: /rank SYMBOL [дни], например /rank BTC или /rank ETHUSDT 7'
+        if len(args) not in (1, 2):
+            await update.message.reply_text(usage)
+            return
+        try:
+            days = int(args[1]) if len(args) == 2 else 1
+        except ValueError:
+            await update.message.reply_text(usage)
+            return
+        if days not in ANALYSIS_PERIODS:
+            await update.message.reply_text(usage + f'\nДоступные периоды: {", ".join(map(str, ANALYSIS_PERIODS))} дн.')
+            return
+        
+        symbol = args[0].upper().replace('/', '')
+        async with open_market_data() as market:
+            rank = await market.get_rank(symbol, days)
+            # Короткая запись без котируемой валюты: BTC -> BTCUSDT
+            if rank is None and QUOTE_FILTER and not symbol.endswith(QUOTE_FILTER):
+                symbol += QUOTE_FILTER
+                rank = await market.get_rank(symbol, days)
+            # Индекс инструментов берем у источника данных: во фронтенде INSTRUMENT_INDEX не заполняется
+            instruments = await market.get_instruments() if rank else {}
+        logger.info(f"Пользователь {user_id} запросил рейтинг {symbol} за {days} дней")
+        
+        if rank is None:
+            await update.message.reply_text(
+                f'Нет данных по {symbol} за {days} дн. В рейтинге топ-{RANK_UNIVERSE_SIZE} монет по объему торгов, '
+                f'он обновляется раз в {RANK_REFRESH_INTERVAL // 60} мин.'
+            )
+            return
+        
+        base_currency, quote_currency = split_symbol(symbol, instruments)
+        message = f'🏆 {base_currency}/{quote_currency} за {days} дн.\n'
+        for metric, emoji, title in (('volatility', '📈', 'Волатильность'), ('drawdown', '📉', 'Просадка')):
+            value, position, total, percentile = rank[metric]
+            message += f'{emoji} {title}: {value}% — место {position} из {total}, выше, чем у {percentile:.0f}% монет\n'
+        await update.message.reply_text(message)
+    except Exception as e:
+        logger.error(f"Ошибка в /rank: {e}")
+        logger.error(traceback.format_exc())
+        await update.message.reply_text('Произошла ошибка. Попробуйте позже.')
+
+# Запуск приложения: теплый кэш из снимка и его периодическое сохранение
+async def on_startup(application):
+    global SNAPSHOT_TASK, NOTIFIER, ALERT_TASK, REPORT_TASK, RANK_TASK
+    if MARKET_DATA_MODE != 'frontend':
+        load_warm_snapshot()
+        SNAPSHOT_TASK = asyncio.create_task(run_snapshot_saver())
+        # При воспроизведении фоновые обновления расходовали бы записанные ответы вне сценария профилирования
+        if not TRAFFIC_REPLAY_PATH:
+            RANK_TASK = asyncio.create_task(run_rank_refresher())
+        await start_http_api()
+    NOTIFIER = RateLimitedSender(application.bot)
+    NOTIFIER.start()
+    try:
+        ALERTS.load()
+        logger.info(f"Загружено подписок на уведомления: {len(ALERTS)}")
+    except Exception as e:
+        logger.error(f"Не удалось загрузить подписки на уведомления {ALERTS.path}: {e}")
+        logger.error(traceback.format_exc())
+    if not TRAFFIC_REPLAY_PATH:
+        ALERT_TASK = asyncio.create_task(run_alert_refresher())
+    try:
+        REPORTS.load()
+        logger.info(f"Загружено подписок на отчеты: {len(REPORTS)}")
+    except Exception as e:
+        logger.error(f"Не удалось загрузить подписки на отчеты {REPORTS.path}: {e}")
+        logger.error(traceback.format_exc())
+    REPORT_TASK = asyncio.create_task(run_report_scheduler())
+    logger.info(f"Бот готов к работе через {time.monotonic() - PROCESS_START_TIME:.2f} с после запуска процесса")
+
+# Остановка приложения: сохраняем снимок, чтобы следующий запуск был теплым
+async def on_shutdown(application):
+    for task in (SNAPSHOT_TASK, ALERT_TASK, REPORT_TASK, RANK_TASK):
+        if task:
+            task.cancel()
+    if NOTIFIER:
+        NOTIFIER.stop()
+    if REPORT_FILE_POOL:
+        REPORT_FILE_POOL.shutdown(wait=False, cancel_futures=True)
+    if MARKET_DATA_MODE != 'frontend':
+        await stop_http_api()
+        await save_warm_snapshot()
+        await close_traffic_recording()
+    await stop_market_data_worker()
+
+# Останавливает процесс-воркер сигналом SIGTERM и ждет, пока он сохранит снимок кэша
+async def stop_market_data_worker():
+    worker = MARKET_DATA_WORKER
+    if worker is None or not worker.is_alive():
+        return
+    logger.info(f"Остановка воркера рыночных данных (процесс {worker.pid})")
+    worker.terminate()
+    await asyncio.to_thread(worker.join, MARKET_DATA_WORKER_STOP_TIMEOUT)
+    if worker.is_alive():
+        logger.warning("Воркер не остановился вовремя, завершаем принудительно")
+        worker.kill()
+
 def main():
+    global MARKET_DATA_MODE, CACHE_BACKEND_URL, QUOTE_FILTER, HTTP_API_PORT
+    global TRAFFIC_RECORD_PATH, TRAFFIC_REPLAY_PATH, TRAFFIC_REPLAY_SPEED, MARKET_DATA_WORKER
+    parser = argparse.ArgumentParser(description='Telegram-бот для анализа волатильности монет Bybit')
+    parser.add_argument(
+        'mode', nargs='?', default='single', choices=['single', 'split', 'worker', 'frontend'],
+        help='single — всё в одном процессе; split — воркер рыночных данных + фронтенд; '
+             'worker — только воркер; frontend — только фронтенд, подключается к запущенному воркеру'
+    )
+    parser.add_argument(
+        '--cache', default=CACHE_BACKEND_URL,
+        help='бэкенд общего кэша: memory://, sqlite:///путь/к/cache.db или redis://host:port/db'
+    )
+    parser.add_argument(
+        '--quote', default=QUOTE_FILTER,
+        help='котируемая валюта анализируемых пар (например USDT); all — все пары'
+    )
+    parser.add_argument(
+        '--api-port', type=int, default=HTTP_API_PORT,
+        help='порт локального HTTP API с таблицей тикеров и метрик; 0 — выключить'
+    )
+    traffic = parser.add_mutually_exclusive_group()
+    traffic.add_argument('--record', metavar='PATH', help='записывать запросы к Bybit и ответы в архив (gzip)')
+    traffic.add_argument('--replay', metavar='PATH', help='отвечать на запросы к Bybit из записанного архива, без сети')
+    parser.add_argument(
+        '--replay-speed', type=float, default=TRAFFIC_REPLAY_SPEED,
+        help='скорость воспроизведения: 1 — с записанными задержками, N — в N раз быстрее, 0 — без задержек'
+    )
+    args = parser.parse_args()
+    CACHE_BACKEND_URL = args.cache
+    HTTP_API_PORT = args.api_port
+    TRAFFIC_RECORD_PATH, TRAFFIC_REPLAY_PATH, TRAFFIC_REPLAY_SPEED = args.record, args.replay, args.replay_speed
+    QUOTE_FILTER = None if args.quote.lower() == 'all' else args.quote.upper()
+
+    if args.mode == 'worker':
+        logger.info("Запуск воркера рыночных данных")
+        run_market_data_worker(quote_filter=QUOTE_FILTER)
+        return
+    if args.mode == 'split':
+        worker = MARKET_DATA_WORKER = multiprocessing.Process(
+            target=run_market_data_worker,
+            args=(CACHE_BACKEND_URL, HTTP_API_PORT, (TRAFFIC_RECORD_PATH, TRAFFIC_REPLAY_PATH, TRAFFIC_REPLAY_SPEED), QUOTE_FILTER),
+            name='market-data-worker', daemon=True
+        )
+        worker.start()
+        logger.info(f"Воркер рыночных данных запущен в процессе {worker.pid}")
+    if args.mode in ('split', 'frontend'):
+        MARKET_DATA_MODE = 'frontend'
+
     try:
-        application = Application.builder().token(TELEGRAM_TOKEN).build()
+        application = Application.builder().token(TELEGRAM_TOKEN).post_init(on_startup).post_shutdown(on_shutdown).build()
         
         # Создаем ConversationHandler
         conv_handler = ConversationHandler(
@@ -470,13 +1929,24 @@ def main():
                 CHOOSING_COINS: [CallbackQueryHandler(select_coins, pattern='^(10|50|100|200|500)$')],
                 CHOOSING_SORT_TYPE: [CallbackQueryHandler(select_sort_type, pattern='^(turnover|volume|marketcap)$')],
                 CHOOSING_PERIOD: [CallbackQueryHandler(select_period, pattern='^(1|3|7|10)$')],
-                CHOOSING_SORT: [CallbackQueryHandler(show_results, pattern='^(volatility|drawdown|both)$')],
+                CHOOSING_SORT: [
+                    CallbackQueryHandler(show_results, pattern='^(volatility|drawdown|both)$'),
+                    CallbackQueryHandler(show_correlation, pattern='^correlation$'),
+                ],
             },
             fallbacks=[CommandHandler('cancel', cancel)],
             per_user=True  # Изолированное состояние для каждого пользователя
         )
         
         application.add_handler(conv_handler)
+        application.add_handler(CallbackQueryHandler(browse_results, pattern='^res:'))
+        application.add_handler(CommandHandler('alert', alert_command))
+        application.add_handler(CommandHandler('alerts', list_alerts))
+        application.add_handler(CommandHandler('unalert', remove_alert))
+        application.add_handler(CommandHandler('subscribe', subscribe_command))
+        application.add_handler(CommandHandler('subscriptions', list_subscriptions))
+        application.add_handler(CommandHandler('unsubscribe', unsubscribe_command))
+        application.add_handler(CommandHandler('rank', rank_command))
         
         logger.info("Бот запущен")
         application.run_polling(allowed_updates=Update.ALL_TYPES, timeout=30)
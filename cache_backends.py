@@ -0,0 +1,382 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from collections import namedtuple
+from urllib.parse import urlparse
+
+# Версионированный снимок значения в кэше: version растет при каждой записи ключа
+Snapshot = namedtuple('Snapshot', ['version', 'updated', 'value'])
+
+# Интерфейс общего кэша. Значения должны сериализоваться в JSON,
+# чтобы все реализации хранили одно и то же.
+class CacheBackend:
+    async def get(self, key):
+        # Возвращает последний Snapshot ключа или None.
+        raise NotImplementedError
+
+    async def put(self, key, value):
+        # Сохраняет новую версию значения и возвращает её Snapshot.
+        raise NotImplementedError
+
+    async def try_lock(self, key, ttl):
+        # Пытается захватить право обновления ключа на ttl секунд.
+        raise NotImplementedError
+
+    async def unlock(self, key):
+        # Освобождает право обновления, если оно принадлежит этому экземпляру.
+        raise NotImplementedError
+
+    async def is_locked(self, key):
+        # Захвачено ли сейчас право обновления ключа (любым экземпляром).
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+# Кэш внутри процесса (поведение по умолчанию, одна реплика)
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self):
+        self.snapshots = {}
+        self.locks = {}  # {key: время истечения}
+
+    async def get(self, key):
+        return self.snapshots.get(key)
+
+    async def put(self, key, value):
+        previous = self.snapshots.get(key)
+        snapshot = Snapshot((previous.version if previous else 0) + 1, time.time(), value)
+        self.snapshots[key] = snapshot
+        return snapshot
+
+    async def try_lock(self, key, ttl):
+        now = time.time()
+        if self.locks.get(key, 0) > now:
+            return False
+        self.locks[key] = now + ttl
+        return True
+
+    async def unlock(self, key):
+        self.locks.pop(key, None)
+
+    async def is_locked(self, key):
+        return self.locks.get(key, 0) > time.time()
+
+# Кэш в общем файле SQLite для нескольких реплик на одной машине
+class SQLiteCacheBackend(CacheBackend):
+    def __init__(self, path):
+        self.path = path
+        self.owner = uuid.uuid4().hex
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots '
+            '(key TEXT PRIMARY KEY, version INTEGER NOT NULL, updated REAL NOT NULL, value TEXT NOT NULL)'
+        )
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS locks '
+            '(key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)'
+        )
+        # Соединение используется из пула потоков, поэтому обращения к нему сериализуем
+        self.lock = asyncio.Lock()
+
+    async def run(self, func, *args):
+        async with self.lock:
+            return await asyncio.to_thread(func, *args)
+
+    def _get(self, key):
+        row = self.connection.execute(
+            'SELECT version, updated, value FROM snapshots WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return Snapshot(row[0], row[1], json.loads(row[2]))
+
+    def _put(self, key, value):
+        now = time.time()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.execute(
+                'INSERT INTO snapshots (key, version, updated, value) VALUES (?, 1, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET version = version + 1, updated = excluded.updated, value = excluded.value',
+                (key, now, json.dumps(value))
+            )
+            version = self.connection.execute('SELECT version FROM snapshots WHERE key = ?', (key,)).fetchone()[0]
+            self.connection.execute('COMMIT')
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        return Snapshot(version, now, value)
+
+    def _try_lock(self, key, ttl):
+        now = time.time()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.execute('DELETE FROM locks WHERE key = ? AND expires <= ?', (key, now))
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO locks (key, owner, expires) VALUES (?, ?, ?)', (key, self.owner, now + ttl)
+            )
+            self.connection.execute('COMMIT')
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        return cursor.rowcount == 1
+
+    def _unlock(self, key):
+        self.connection.execute('DELETE FROM locks WHERE key = ? AND owner = ?', (key, self.owner))
+
+    def _is_locked(self, key):
+        row = self.connection.execute('SELECT 1 FROM locks WHERE key = ? AND expires > ?', (key, time.time())).fetchone()
+        return row is not None
+
+    async def get(self, key):
+        return await self.run(self._get, key)
+
+    async def put(self, key, value):
+        return await self.run(self._put, key, value)
+
+    async def try_lock(self, key, ttl):
+        return await self.run(self._try_lock, key, ttl)
+
+    async def unlock(self, key):
+        await self.run(self._unlock, key)
+
+    async def is_locked(self, key):
+        return await self.run(self._is_locked, key)
+
+    async def close(self):
+        self.connection.close()
+
+# Кэш в Redis (или любом сервере с протоколом RESP), без внешних зависимостей
+UNLOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, host='127.0.0.1', port=6379, db=0, prefix='volatilitybot'):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.prefix = prefix
+        self.owner = uuid.uuid4().hex
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def command(self, *args):
+        # Команды в одном соединении выполняются строго по очереди.
+        # При обрыве соединения (например, перезапуске Redis) переподключаемся и повторяем команду один раз.
+        async with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.writer is None:
+                        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                        if self.db:
+                            self.writer.write(encode_resp_command('SELECT', self.db))
+                            await read_resp_reply(self.reader)
+                    self.writer.write(encode_resp_command(*args))
+                    await self.writer.drain()
+                    return await read_resp_reply(self.reader)
+                except (OSError, asyncio.IncompleteReadError):
+                    self.reset_connection()
+                    if attempt:
+                        raise
+
+    def reset_connection(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+    async def get(self, key):
+        raw = await self.command('GET', f'{self.prefix}:snapshot:{key}')
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return Snapshot(data['version'], data['updated'], data['value'])
+
+    async def put(self, key, value):
+        version = await self.command('INCR', f'{self.prefix}:version:{key}')
+        snapshot = Snapshot(version, time.time(), value)
+        await self.command('SET', f'{self.prefix}:snapshot:{key}', json.dumps(snapshot._asdict()))
+        return snapshot
+
+    async def try_lock(self, key, ttl):
+        reply = await self.command('SET', f'{self.prefix}:lock:{key}', self.owner, 'NX', 'PX', int(ttl * 1000))
+        return reply == 'OK'
+
+    async def unlock(self, key):
+        # Сравнение и удаление одной командой: блокировку, истекшую и захваченную другой репликой, не трогаем
+        await self.command('EVAL', UNLOCK_SCRIPT, 1, f'{self.prefix}:lock:{key}', self.owner)
+
+    async def is_locked(self, key):
+        return await self.command('EXISTS', f'{self.prefix}:lock:{key}') > 0
+
+    async def close(self):
+        self.reset_connection()
+
+class RespError(Exception):
+    pass
+
+def encode_resp_command(*args):
+    parts = [f'*{len(args)}\r\n'.encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f'${len(data)}\r\n'.encode() + data + b'\r\n')
+    return b''.join(parts)
+
+async def read_resp_reply(reader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError('Сервер кэша закрыл соединение')
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload.decode()
+    if kind == b'-':
+        raise RespError(payload.decode())
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(payload)
+        if count < 0:
+            return None
+        return [await read_resp_reply(reader) for _ in range(count)]
+    raise RespError(f'Неизвестный тип ответа: {line!r}')
+
+async def read_resp_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        return line.strip().split()
+    count = int(line[1:-2])
+    args = []
+    for _ in range(count):
+        header = await reader.readline()
+        length = int(header[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+# Минимальная локальная замена Redis (GET/SET NX PX/DEL/EXISTS/INCR/PING/SELECT и EVAL скрипта UNLOCK_SCRIPT)
+# для проверки RedisCacheBackend без настоящего сервера
+class LocalRespServer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.data = {}
+        self.expires = {}
+        self.server = None
+        self.clients = {}  # {writer: задача обработки соединения}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            # Закрываем и открытые соединения и ждем, пока их обработчики завершатся
+            tasks = list(self.clients.values())
+            for writer in list(self.clients):
+                writer.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.server.wait_closed()
+
+    def lookup(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def execute(self, args):
+        name = args[0].upper()
+        if name == b'PING':
+            return b'+PONG\r\n'
+        if name == b'SELECT':
+            return b'+OK\r\n'
+        if name == b'GET':
+            value = self.lookup(args[1])
+            return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+        if name == b'SET':
+            key, value = args[1], args[2]
+            options = [arg.upper() for arg in args[3:]]
+            if b'NX' in options and self.lookup(key) is not None:
+                return b'$-1\r\n'
+            self.data[key] = value
+            self.expires.pop(key, None)
+            if b'PX' in options:
+                self.expires[key] = time.time() + int(args[3 + options.index(b'PX') + 1]) / 1000
+            return b'+OK\r\n'
+        if name == b'DEL':
+            removed = 0
+            for key in args[1:]:
+                if self.lookup(key) is not None:
+                    removed += 1
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return b':%d\r\n' % removed
+        if name == b'EXISTS':
+            return b':%d\r\n' % sum(self.lookup(key) is not None for key in args[1:])
+        if name == b'INCR':
+            value = int(self.lookup(args[1]) or 0) + 1
+            self.data[args[1]] = str(value).encode()
+            return b':%d\r\n' % value
+        if name == b'EVAL' and args[1].decode() == UNLOCK_SCRIPT:
+            key, owner = args[3], args[4]
+            if self.lookup(key) != owner:
+                return b':0\r\n'
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+            return b':1\r\n'
+        return b'-ERR unknown command\r\n'
+
+    async def handle_client(self, reader, writer):
+        self.clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                args = await read_resp_command(reader)
+                if not args:
+                    break
+                writer.write(self.execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.pop(writer, None)
+            writer.close()
+
+# Создает бэкенд по адресу: memory://, sqlite:///путь/к/файлу.db, redis://host:port/db
+def create_cache_backend(url):
+    parsed = urlparse(url)
+    if parsed.scheme in ('', 'memory'):
+        return MemoryCacheBackend()
+    if parsed.scheme == 'sqlite':
+        path = parsed.path if not parsed.netloc else parsed.netloc + parsed.path
+        return SQLiteCacheBackend(os.path.expanduser(path))
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.lstrip('/') or 0)
+        return RedisCacheBackend(parsed.hostname or '127.0.0.1', parsed.port or 6379, db)
+    raise ValueError(f'Неизвестный бэкенд кэша: {url}')
+
+# Ждет, пока другая реплика опубликует версию новее known_version. Возвращает None сразу,
+# как только блокировка снята без новой версии (у реплики не получилось обновить ключ).
+async def wait_for_update(backend, key, known_version, timeout, interval=0.5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+        # Блокировку проверяем до чтения: новая версия записывается раньше, чем снимается блокировка
+        locked = await backend.is_locked(key)
+        snapshot = await backend.get(key)
+        if snapshot and snapshot.version > known_version:
+            return snapshot
+        if not locked:
+            return None
+    return None
@@ -0,0 +1,94 @@
+# Анализ корреляций доходностей и кластеризация монет.
+# numpy импортируется лениво: он нужен только для этого анализа.
+
+# Выравнивает ряды цен по общей сетке времени и возвращает (symbols, матрица цен n x T)
+def align_closes(series, min_coverage):
+    import numpy as np
+
+    grid = sorted({start for starts, _ in series.values() for start in starts})
+    if len(grid) < 3:
+        return [], np.empty((0, 0))
+    position = {start: i for i, start in enumerate(grid)}
+
+    symbols = []
+    rows = []
+    for symbol, (starts, closes) in series.items():
+        if len(starts) < min_coverage * len(grid):
+            continue
+        row = np.full(len(grid), np.nan)
+        row[[position[start] for start in starts]] = closes
+        rows.append(row)
+        symbols.append(symbol)
+    if not rows:
+        return [], np.empty((0, 0))
+
+    prices = np.vstack(rows)
+    # Пропуски заполняем последней известной ценой (нулевая доходность), начало — первой известной
+    index = np.where(np.isnan(prices), 0, np.arange(prices.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    prices = prices[np.arange(prices.shape[0])[:, None], index]
+    first_valid = np.argmax(~np.isnan(prices), axis=1)
+    prices = np.where(np.isnan(prices), prices[np.arange(prices.shape[0]), first_valid][:, None], prices)
+    return symbols, prices
+
+# Матрица попарных корреляций логарифмических доходностей (n x n)
+def correlation_matrix(prices):
+    import numpy as np
+
+    returns = np.diff(np.log(prices), axis=1)
+    returns -= returns.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(returns, axis=1)
+    norms[norms == 0] = np.inf  # Монеты без движения цены ни с чем не коррелируют
+    normalized = returns / norms[:, None]
+    return np.clip(normalized @ normalized.T, -1.0, 1.0)
+
+# Кластеры: компоненты связности графа, где ребро — корреляция не ниже threshold
+def find_clusters(corr, threshold):
+    import numpy as np
+
+    parent = list(range(corr.shape[0]))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in np.argwhere(np.triu(corr >= threshold, 1)):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[root_j] = root_i
+
+    clusters = {}
+    for i in range(corr.shape[0]):
+        clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+# Полный анализ: возвращает словарь с количеством монет, точек, топом пар и кластерами.
+# series: {symbol: (starts, closes)}; вызывается вне цикла событий.
+def analyze_correlations(series, top_pairs=15, cluster_threshold=0.8, min_coverage=0.9):
+    import numpy as np
+
+    # Bybit отдает свечи от новых к старым, переворачиваем в хронологический порядок
+    series = {symbol: (list(starts)[::-1], list(closes)[::-1]) for symbol, (starts, closes) in series.items()}
+    symbols, prices = align_closes(series, min_coverage)
+    if len(symbols) < 2:
+        return {'coins': len(symbols), 'points': prices.shape[1] if prices.size else 0, 'pairs': [], 'clusters': []}
+
+    corr = correlation_matrix(prices)
+    n = len(symbols)
+    rows, cols = np.triu_indices(n, 1)
+    values = corr[rows, cols]
+    top = min(top_pairs, len(values))
+    best = np.argpartition(-values, top - 1)[:top]
+    best = best[np.argsort(-values[best])]
+    pairs = [(symbols[rows[k]], symbols[cols[k]], round(float(values[k]), 3)) for k in best]
+
+    clusters = []
+    for members in find_clusters(corr, cluster_threshold):
+        block = corr[np.ix_(members, members)]
+        mean_corr = (block.sum() - len(members)) / (len(members) * (len(members) - 1))
+        clusters.append({'symbols': [symbols[i] for i in members], 'mean_correlation': round(float(mean_corr), 3)})
+    clusters.sort(key=lambda c: (len(c['symbols']), c['mean_correlation']), reverse=True)
+
+    return {'coins': n, 'points': prices.shape[1], 'pairs': pairs, 'clusters': clusters}
@@ -0,0 +1,192 @@
+import base64
+import csv
+import hashlib
+import io
+import json
+
+from aiohttp import web
+
+# Локальный HTTP/JSON API только для чтения: таблица тикеров и метрики по периодам
+# отдаются прямо из кэша в памяти, без обращений к Bybit.
+#
+#   GET /api/tickers
+#   GET /api/metrics?days=7
+#
+# Параметры запроса:
+#   sort=поле или sort=-поле (по убыванию), по умолчанию -turnover
+#   fields=symbol,volatility,... — какие поля вернуть
+#   quote=USDT, symbol=BTC (префикс символа), min_ПОЛЕ=X, max_ПОЛЕ=Y — фильтры
+#   limit=N (до MAX_LIMIT), cursor=... — курсорная пагинация (значение next_cursor из ответа)
+#   format=json|csv или заголовок Accept: text/csv
+# Ответы содержат ETag; при совпадении If-None-Match возвращается 304.
+
+TICKER_FIELDS = ('symbol', 'base', 'quote', 'last_price', 'volume', 'turnover', 'market_cap')
+METRIC_FIELDS = TICKER_FIELDS + ('volatility', 'drawdown', 'updated')
+NUMERIC_FIELDS = ('last_price', 'volume', 'turnover', 'market_cap', 'volatility', 'drawdown', 'updated')
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+STREAM_CHUNK_ROWS = 200
+
+class ApiError(Exception):
+    pass
+
+def encode_cursor(row, sort_field):
+    data = json.dumps([row[sort_field], row['symbol']]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, symbol = json.loads(base64.urlsafe_b64decode(padded))
+        return value, symbol
+    except Exception:
+        raise ApiError('некорректный cursor')
+
+# Фильтрация, сортировка и пагинация строк таблицы по параметрам запроса
+def select_rows(rows, query, allowed_fields):
+    sort = query.get('sort', '-turnover')
+    descending = sort.startswith('-')
+    sort_field = sort.lstrip('-+')
+    if sort_field not in allowed_fields:
+        raise ApiError(f'нельзя сортировать по полю {sort_field}')
+
+    fields = query.get('fields')
+    fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else list(allowed_fields)
+    unknown = [field for field in fields if field not in allowed_fields]
+    if unknown:
+        raise ApiError(f'неизвестные поля: {", ".join(unknown)}')
+
+    try:
+        limit = int(query.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    filters = []
+    if query.get('quote'):
+        quote = query['quote'].upper()
+        filters.append(lambda row: row.get('quote') == quote)
+    if query.get('symbol'):
+        prefix = query['symbol'].upper()
+        filters.append(lambda row: row['symbol'].startswith(prefix))
+    for key, raw in query.items():
+        bound, _, field = key.partition('_')
+        if bound not in ('min', 'max') or not field:
+            continue
+        if field not in NUMERIC_FIELDS or field not in allowed_fields:
+            raise ApiError(f'нельзя фильтровать по полю {field}')
+        try:
+            limit_value = float(raw)
+        except ValueError:
+            raise ApiError(f'{key} должен быть числом')
+        if bound == 'min':
+            filters.append(lambda row, f=field, v=limit_value: row[f] >= v)
+        else:
+            filters.append(lambda row, f=field, v=limit_value: row[f] <= v)
+
+    selected = [row for row in rows if all(check(row) for check in filters)]
+
+    # Сортировка по (значение, символ) дает стабильный порядок для курсора
+    def sort_key(row):
+        return row[sort_field], row['symbol']
+    selected.sort(key=sort_key, reverse=descending)
+    total = len(selected)
+
+    if query.get('cursor'):
+        after = decode_cursor(query['cursor'])
+        try:
+            if descending:
+                selected = [row for row in selected if sort_key(row) < after]
+            else:
+                selected = [row for row in selected if sort_key(row) > after]
+        except TypeError:
+            raise ApiError('cursor не соответствует сортировке')
+
+    page = selected[:limit]
+    next_cursor = encode_cursor(page[-1], sort_field) if len(selected) > limit else None
+    return fields, page, next_cursor, total
+
+def make_etag(version, request):
+    canonical = '&'.join(f'{key}={value}' for key, value in sorted(request.query.items()))
+    accept = request.headers.get('Accept', '')
+    digest = hashlib.sha1(f'{version}|{request.path}|{canonical}|{accept}'.encode()).hexdigest()[:16]
+    return f'"{digest}"'
+
+def wants_csv(request):
+    fmt = request.query.get('format')
+    if fmt:
+        return fmt.lower() == 'csv'
+    return 'text/csv' in request.headers.get('Accept', '')
+
+# Потоковая отдача: строки сериализуются кусками, весь ответ целиком в памяти не собирается
+async def stream_rows(request, etag, fields, rows, next_cursor, total):
+    as_csv = wants_csv(request)
+    response = web.StreamResponse(headers={
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        'Content-Type': 'text/csv; charset=utf-8' if as_csv else 'application/json; charset=utf-8',
+        'X-Total-Count': str(total),
+    })
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    if as_csv:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        for start in range(0, len(rows), STREAM_CHUNK_ROWS):
+            for row in rows[start:start + STREAM_CHUNK_ROWS]:
+                writer.writerow([row.get(field) for field in fields])
+            await response.write(buffer.getvalue().encode())
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            await response.write(buffer.getvalue().encode())
+    else:
+        await response.write(b'{"data":[')
+        for start in range(0, len(rows), STREAM_CHUNK_ROWS):
+            chunk = rows[start:start + STREAM_CHUNK_ROWS]
+            prefix = b',' if start else b''
+            await response.write(prefix + ','.join(
+                json.dumps({field: row.get(field) for field in fields}, ensure_ascii=False) for row in chunk
+            ).encode())
+        tail = {'next_cursor': next_cursor, 'total': total}
+        await response.write(b'],' + json.dumps(tail)[1:].encode())
+    await response.write_eof()
+    return response
+
+# Создает приложение API. get_table(kind, days) возвращает (версия данных, строки таблицы),
+# где kind — 'tickers' или 'metrics'.
+def create_api_app(get_table, periods):
+    async def handle_table(request, kind, allowed_fields):
+        try:
+            days = None
+            if kind == 'metrics':
+                try:
+                    days = int(request.query.get('days', 7))
+                except ValueError:
+                    raise ApiError('days должен быть числом')
+                if days not in periods:
+                    raise ApiError(f'days должен быть одним из {", ".join(map(str, periods))}')
+
+            version, rows = get_table(kind, days)
+            etag = make_etag(version, request)
+            if etag in request.headers.get('If-None-Match', ''):
+                return web.Response(status=304, headers={'ETag': etag})
+            fields, page, next_cursor, total = select_rows(rows, request.query, allowed_fields)
+            return await stream_rows(request, etag, fields, page, next_cursor, total)
+        except ApiError as e:
+            return web.json_response({'error': str(e)}, status=400, dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    async def tickers(request):
+        return await handle_table(request, 'tickers', TICKER_FIELDS)
+
+    async def metrics(request):
+        return await handle_table(request, 'metrics', METRIC_FIELDS)
+
+    app = web.Application()
+    app.router.add_get('/api/tickers', tickers)
+    app.router.add_get('/api/metrics', metrics)
+    return app
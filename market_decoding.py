@@ -0,0 +1,102 @@
+import json
+from array import array
+
+# Быстрые JSON-бэкенды необязательны и импортируются лениво, при первом разборе ответа,
+# чтобы не замедлять запуск: используем лучший из установленных
+JSON_BACKEND = None
+msgspec = None
+orjson = None
+KLINE_DECODER = None
+TICKERS_DECODER = None
+
+TICKER_NUMERIC_FIELDS = (
+    ('volume', 'volume24h'),
+    ('turnover', 'turnover24h'),
+    ('market_cap', 'marketCap'),
+    ('last_price', 'lastPrice'),
+)
+
+def load_backend():
+    global JSON_BACKEND, msgspec, orjson, KLINE_DECODER, TICKERS_DECODER
+    if JSON_BACKEND is not None:
+        return JSON_BACKEND
+    try:
+        import msgspec
+    except ImportError:
+        msgspec = None
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+
+    if msgspec is not None:
+        # Типизированные схемы ответов Bybit. Числа в свечах приходят строками,
+        # strict=False позволяет msgspec сразу разобрать время открытия и цену закрытия
+        # как int/float; остальные поля свечи не нужны и остаются строками.
+        class KlineResult(msgspec.Struct):
+            rows: list[tuple[int, str, str, str, float, str, str]] = msgspec.field(default_factory=list, name='list')
+
+        class KlineResponse(msgspec.Struct):
+            retCode: int
+            retMsg: str = ''
+            result: KlineResult = msgspec.field(default_factory=KlineResult)
+
+        class Ticker(msgspec.Struct):
+            symbol: str
+            volume24h: str = ''
+            turnover24h: str = ''
+            marketCap: str = ''
+            lastPrice: str = ''
+
+        class TickersResult(msgspec.Struct):
+            rows: list[Ticker] = msgspec.field(default_factory=list, name='list')
+
+        class TickersResponse(msgspec.Struct):
+            retCode: int
+            retMsg: str = ''
+            result: TickersResult = msgspec.field(default_factory=TickersResult)
+
+        KLINE_DECODER = msgspec.json.Decoder(KlineResponse, strict=False)
+        TICKERS_DECODER = msgspec.json.Decoder(TickersResponse)
+        JSON_BACKEND = 'msgspec'
+    elif orjson is not None:
+        JSON_BACKEND = 'orjson'
+    else:
+        JSON_BACKEND = 'json'
+    return JSON_BACKEND
+
+def loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def to_float(value):
+    return float(value) if value else 0.0
+
+# Разбирает ответ /kline в массивы времени открытия и цен закрытия (от новых к старым, как отдает Bybit)
+def decode_kline(raw):
+    if load_backend() == 'msgspec':
+        data = KLINE_DECODER.decode(raw)
+        rows = data.result.rows
+        return data.retCode, data.retMsg, array('q', [row[0] for row in rows]), array('d', [row[4] for row in rows])
+    data = loads(raw)
+    if data['retCode'] != 0:
+        return data['retCode'], data.get('retMsg', ''), array('q'), array('d')
+    rows = data['result']['list']
+    return data['retCode'], data.get('retMsg', ''), array('q', [int(row[0]) for row in rows]), array('d', [float(row[4]) for row in rows])
+
+# Разбирает ответ /tickers в колонки: список символов и массивы объема, оборота, капитализации и цены
+def decode_tickers(raw):
+    if load_backend() == 'msgspec':
+        data = TICKERS_DECODER.decode(raw)
+        rows = data.result.rows
+        columns = {'symbol': [row.symbol for row in rows]}
+        for column, field in TICKER_NUMERIC_FIELDS:
+            columns[column] = array('d', [to_float(getattr(row, field)) for row in rows])
+        return data.retCode, data.retMsg, columns
+    data = loads(raw)
+    rows = data['result']['list'] if data['retCode'] == 0 else []
+    columns = {'symbol': [row['symbol'] for row in rows]}
+    for column, field in TICKER_NUMERIC_FIELDS:
+        columns[column] = array('d', [to_float(row.get(field)) for row in rows])
+    return data['retCode'], data.get('retMsg', ''), columns
@@ -0,0 +1,50 @@
+from bisect import bisect_left, bisect_right, insort
+
+# Отсортированный массив значений одной метрики за один период.
+# Обновление монеты — O(log n) поиск + сдвиг в массиве, запрос места и процентиля — O(log n).
+class RankingIndex:
+    def __init__(self):
+        self.values = {}  # {symbol: значение}
+        self.sorted_values = []
+
+    def __len__(self):
+        return len(self.sorted_values)
+
+    def update(self, symbol, value):
+        previous = self.values.get(symbol)
+        if previous == value:
+            return
+        if previous is not None:
+            self.sorted_values.pop(bisect_left(self.sorted_values, previous))
+        insort(self.sorted_values, value)
+        self.values[symbol] = value
+
+    # Возвращает (значение, место по убыванию начиная с 1, всего монет, процент монет с меньшим значением)
+    def lookup(self, symbol):
+        value = self.values.get(symbol)
+        if value is None:
+            return None
+        total = len(self.sorted_values)
+        position = total - bisect_right(self.sorted_values, value) + 1
+        percentile = bisect_left(self.sorted_values, value) / total * 100
+        return value, position, total, percentile
+
+# Рейтинги монет по волатильности и просадке для каждого периода
+class Rankings:
+    def __init__(self):
+        self.indexes = {}  # {(metric, days): RankingIndex}
+
+    def update(self, symbol, days, volatility, drawdown):
+        for metric, value in (('volatility', volatility), ('drawdown', drawdown)):
+            self.indexes.setdefault((metric, days), RankingIndex()).update(symbol, value)
+
+    # {'volatility': (значение, место, всего, процентиль), 'drawdown': ...} или None, если монеты нет в рейтинге
+    def lookup(self, symbol, days):
+        result = {}
+        for metric in ('volatility', 'drawdown'):
+            index = self.indexes.get((metric, days))
+            found = index.lookup(symbol) if index else None
+            if found is None:
+                return None
+            result[metric] = found
+        return result
@@ -0,0 +1,81 @@
+import csv
+import io
+
+# Отрисовка графиков и файлов с результатами анализа.
+# Функции принимают и возвращают только простые данные (списки словарей, bytes),
+# поэтому выполняются в пуле процессов. matplotlib и openpyxl импортируются лениво.
+
+COLUMNS = (
+    ('symbol', 'Символ'),
+    ('base', 'Базовая'),
+    ('quote', 'Котируемая'),
+    ('last_price', 'Цена'),
+    ('volatility', 'Волатильность, %'),
+    ('drawdown', 'Просадка, %'),
+    ('turnover', 'Объем 24ч, $'),
+    ('volume', 'Объем 24ч'),
+    ('market_cap', 'Капитализация, $'),
+)
+CHART_LABELS = 15  # Сколько монет подписывать на диаграмме
+
+def render_csv(results):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['#'] + [name for _, name in COLUMNS])
+    for i, coin in enumerate(results, 1):
+        writer.writerow([i] + [coin.get(key) for key, _ in COLUMNS])
+    # BOM, чтобы Excel правильно открыл кириллицу в заголовках
+    return buffer.getvalue().encode('utf-8-sig')
+
+def render_xlsx(results, title):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Результаты')
+    sheet.append([title])
+    sheet.append(['#'] + [name for _, name in COLUMNS])
+    for i, coin in enumerate(results, 1):
+        sheet.append([i] + [coin.get(key) for key, _ in COLUMNS])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+# Диаграмма рассеяния «волатильность — просадка», размер точки зависит от объема торгов
+def render_scatter(results, title):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    volatility = [coin['volatility'] for coin in results]
+    drawdown = [coin['drawdown'] for coin in results]
+    max_turnover = max((coin['turnover'] for coin in results), default=0) or 1
+    sizes = [20 + 300 * (coin['turnover'] / max_turnover) ** 0.5 for coin in results]
+
+    figure, axes = plt.subplots(figsize=(10, 7), dpi=110)
+    try:
+        axes.scatter(volatility, drawdown, s=sizes, alpha=0.5, color='tab:blue', edgecolors='none')
+        for coin in results[:CHART_LABELS]:
+            axes.annotate(coin['base'], (coin['volatility'], coin['drawdown']),
+                          fontsize=8, xytext=(4, 4), textcoords='offset points')
+        axes.set_xlabel('Волатильность, %')
+        axes.set_ylabel('Просадка, %')
+        axes.set_title(title)
+        axes.grid(alpha=0.3)
+        figure.tight_layout()
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format='png')
+        return buffer.getvalue()
+    finally:
+        plt.close(figure)
+
+# Собирает файл нужного типа: 'chart' -> PNG, 'csv' -> CSV, 'xlsx' -> XLSX.
+# Без openpyxl вместо XLSX возвращается CSV. Возвращает (bytes, расширение).
+def render_report_file(kind, results, title):
+    if kind == 'chart':
+        return render_scatter(results, title), 'png'
+    if kind == 'xlsx':
+        try:
+            return render_xlsx(results, title), 'xlsx'
+        except ImportError:
+            pass
+    return render_csv(results), 'csv'
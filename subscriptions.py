@@ -0,0 +1,66 @@
+import json
+import os
+from collections import namedtuple
+
+# Подписка на регулярный отчет: конфигурация анализа и время отправки (ЧЧ:ММ по UTC)
+ReportSubscription = namedtuple(
+    'ReportSubscription', ['id', 'chat_id', 'num_coins', 'sort_type', 'days', 'sort_by', 'time']
+)
+
+# Хранилище подписок на отчеты с сохранением в JSON-файл, чтобы они переживали перезапуск
+class ReportSubscriptions:
+    def __init__(self, path):
+        self.path = path
+        self.subscriptions = {}  # {id: ReportSubscription}
+        self.next_id = 1
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        self.subscriptions = {item['id']: ReportSubscription(**item) for item in data.get('subscriptions', [])}
+        self.next_id = max(data.get('next_id', 1), max(self.subscriptions, default=0) + 1)
+
+    def save(self):
+        data = {
+            'next_id': self.next_id,
+            'subscriptions': [subscription._asdict() for subscription in self.subscriptions.values()]
+        }
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, chat_id, num_coins, sort_type, days, sort_by, time):
+        subscription = ReportSubscription(self.next_id, chat_id, num_coins, sort_type, days, sort_by, time)
+        self.next_id += 1
+        self.subscriptions[subscription.id] = subscription
+        self.save()
+        return subscription
+
+    def remove(self, subscription_id, chat_id=None):
+        subscription = self.subscriptions.get(subscription_id)
+        if subscription is None or (chat_id is not None and subscription.chat_id != chat_id):
+            return False
+        del self.subscriptions[subscription_id]
+        self.save()
+        return True
+
+    def for_chat(self, chat_id):
+        return [subscription for subscription in self.subscriptions.values() if subscription.chat_id == chat_id]
+
+    # Подписки на заданное время, сгруппированные по конфигурации отчета:
+    # {(num_coins, sort_type, days, sort_by): [chat_id, ...]}
+    def due(self, time):
+        groups = {}
+        for subscription in self.subscriptions.values():
+            if subscription.time == time:
+                key = (subscription.num_coins, subscription.sort_type, subscription.days, subscription.sort_by)
+                chats = groups.setdefault(key, [])
+                if subscription.chat_id not in chats:
+                    chats.append(subscription.chat_id)
+        return groups
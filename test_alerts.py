@@ -0,0 +1,41 @@
+from alerts import AlertIndex
+
+def test_matching_is_strict():
+    alerts = AlertIndex()
+    above = alerts.add(1, 'BTCUSDT', 'volatility', '>', 5, 1)
+    below = alerts.add(2, 'BTCUSDT', 'volatility', '<', 5, 1)
+    anywhere = alerts.add(3, None, 'volatility', '>', 10, 1)
+
+    assert alerts.matching('volatility', 1, 'BTCUSDT', 5) == []
+    assert alerts.matching('volatility', 1, 'BTCUSDT', 5.01) == [above]
+    assert alerts.matching('volatility', 1, 'BTCUSDT', 4.99) == [below]
+    assert set(alerts.matching('volatility', 1, 'BTCUSDT', 11)) == {above, anywhere}
+    assert alerts.matching('volatility', 1, 'ETHUSDT', 11) == [anywhere]
+    assert alerts.matching('volatility', 3, 'BTCUSDT', 11) == []
+
+    assert alerts.remove(above.id)
+    assert alerts.matching('volatility', 1, 'BTCUSDT', 6) == []
+
+def test_cooldown_and_unchanged_values():
+    alerts = AlertIndex(cooldown=60)
+    alert = alerts.add(1, 'BTCUSDT', 'drawdown', '>', 3, 7)
+    assert alerts.evaluate('BTCUSDT', 7, 1.0, 4.0, now=1000) == [(alert, 4.0)]
+    assert alerts.evaluate('BTCUSDT', 7, 1.0, 4.0, now=1100) == []
+    assert alerts.evaluate('BTCUSDT', 7, 1.0, 4.5, now=1030) == []
+    assert alerts.evaluate('BTCUSDT', 7, 1.0, 5.0, now=1100) == [(alert, 5.0)]
+
+def test_persistence(tmp_path):
+    path = str(tmp_path / 'alerts.json')
+    alerts = AlertIndex(path, cooldown=60)
+    first = alerts.add(1, 'BTCUSDT', 'volatility', '>', 5, 1)
+    second = alerts.add(2, None, 'drawdown', '<', 2.5, 7)
+    alerts.remove(alerts.add(3, 'ETHUSDT', 'volatility', '>', 1, 1).id)
+    assert alerts.evaluate('BTCUSDT', 1, 6.0, 0.0, now=1000) == [(first, 6.0)]
+
+    restored = AlertIndex(path, cooldown=60)
+    restored.load()
+    assert sorted(restored.alerts.values()) == sorted([first, second])
+    assert restored.matching('drawdown', 7, 'SOLUSDT', 1.0) == [second]
+    # Время последнего уведомления тоже восстановлено
+    assert restored.evaluate('BTCUSDT', 1, 7.0, 0.0, now=1030) == []
+    assert restored.add(4, 'SOLUSDT', 'volatility', '>', 1, 1).id == 4
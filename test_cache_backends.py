@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from cache_backends import LocalRespServer, MemoryCacheBackend, RedisCacheBackend, SQLiteCacheBackend, wait_for_update
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def check_backend(first, second):
+    # Версии растут при каждой записи и видны всем экземплярам
+    assert await first.get('tickers') is None
+    snapshot = await first.put('tickers', {'BTCUSDT': 1})
+    assert snapshot.version == 1
+    assert (await second.put('tickers', {'BTCUSDT': 2})).version == 2
+    loaded = await first.get('tickers')
+    assert (loaded.version, loaded.value) == (2, {'BTCUSDT': 2})
+
+    # Право обновления получает только один экземпляр, до unlock или истечения ttl
+    assert not await second.is_locked('tickers')
+    assert await first.try_lock('tickers', 10)
+    assert await second.is_locked('tickers')
+    assert not await second.try_lock('tickers', 10)
+    await first.unlock('tickers')
+    assert not await second.is_locked('tickers')
+    assert await second.try_lock('tickers', 0.05)
+    await asyncio.sleep(0.1)
+    assert not await first.is_locked('tickers')
+    assert await first.try_lock('tickers', 10)
+    await first.unlock('tickers')
+
+    # Ожидающий получает новую версию, а если держатель блокировки ничего не записал — сразу None
+    assert await first.try_lock('metrics', 10)
+    waiter = asyncio.create_task(wait_for_update(second, 'metrics', 0, 5, interval=0.01))
+    await asyncio.sleep(0.05)
+    await first.put('metrics', [1.0, 2.0])
+    await first.unlock('metrics')
+    assert (await waiter).value == [1.0, 2.0]
+
+    assert await first.try_lock('metrics', 10)
+    started = time.monotonic()
+    waiter = asyncio.create_task(wait_for_update(second, 'metrics', 1, 5, interval=0.01))
+    await asyncio.sleep(0.05)
+    await first.unlock('metrics')
+    assert await waiter is None
+    assert time.monotonic() - started < 1
+
+def test_memory_backend():
+    backend = MemoryCacheBackend()
+    run(check_backend(backend, backend))
+
+def test_sqlite_backend(tmp_path):
+    async def scenario():
+        path = str(tmp_path / 'cache.db')
+        first, second = SQLiteCacheBackend(path), SQLiteCacheBackend(path)
+        try:
+            await check_backend(first, second)
+            # Чужую блокировку unlock не снимает
+            assert await first.try_lock('tickers', 10)
+            await second.unlock('tickers')
+            assert not await second.try_lock('tickers', 10)
+        finally:
+            await first.close()
+            await second.close()
+    run(scenario())
+
+def test_redis_backend_with_local_server():
+    async def scenario():
+        server = await LocalRespServer().start()
+        first = RedisCacheBackend('127.0.0.1', server.port)
+        second = RedisCacheBackend('127.0.0.1', server.port)
+        try:
+            await check_backend(first, second)
+            # Истекшую блокировку, которую уже захватила другая реплика, прежний владелец не снимает
+            assert await second.try_lock('refresh', 0.05)
+            await asyncio.sleep(0.1)
+            assert await first.try_lock('refresh', 10)
+            await second.unlock('refresh')
+            assert not await second.try_lock('refresh', 10)
+
+            # После обрыва соединения команда выполняется через новое подключение
+            first.writer.transport.abort()
+            assert (await first.get('tickers')).version == 2
+        finally:
+            await first.close()
+            await second.close()
+            await server.stop()
+    run(scenario())
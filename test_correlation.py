@@ -0,0 +1,55 @@
+import math
+
+import pytest
+
+from correlation import align_closes, analyze_correlations, correlation_matrix, find_clusters
+
+# numpy — необязательная зависимость бота
+np = pytest.importorskip('numpy')
+
+def test_align_closes_fills_gaps_and_drops_sparse_series():
+    series = {
+        'AUSDT': ([1, 2, 3, 4, 5], [10.0, 11.0, 12.0, 13.0, 14.0]),
+        # Пропуск в середине заполняется предыдущей ценой, в начале — первой известной
+        'BUSDT': ([2, 4, 5], [20.0, 22.0, 23.0]),
+        'CUSDT': ([5], [1.0]),
+    }
+    symbols, prices = align_closes(series, min_coverage=0.6)
+    assert symbols == ['AUSDT', 'BUSDT']
+    assert prices.tolist() == [[10.0, 11.0, 12.0, 13.0, 14.0], [20.0, 20.0, 20.0, 22.0, 23.0]]
+
+def test_align_closes_needs_at_least_three_points():
+    symbols, prices = align_closes({'AUSDT': ([1, 2], [1.0, 2.0])}, min_coverage=0.5)
+    assert symbols == [] and prices.size == 0
+
+def test_correlation_matrix_and_clusters():
+    t = np.arange(50)
+    base = np.exp(0.01 * np.sin(t))
+    prices = np.vstack([base, base * 2, np.exp(-0.01 * np.sin(t)), np.full(50, 5.0)])
+    corr = correlation_matrix(prices)
+    assert corr[0, 1] == pytest.approx(1.0)
+    assert corr[0, 2] == pytest.approx(-1.0)
+    # Монета без движения цены ни с чем не коррелирует
+    assert corr[3, 0] == 0 and not math.isnan(corr[3, 3])
+    assert find_clusters(corr, 0.8) == [[0, 1]]
+
+def test_analyze_correlations_reports_pairs_and_clusters():
+    t = np.arange(40)
+    up = 100 * np.exp(0.02 * np.sin(t / 3))
+    noise = 100 * np.exp(0.02 * np.cos(t * 1.7))
+    starts = list(range(40))[::-1]
+    # Bybit отдает свечи от новых к старым
+    series = {
+        'AUSDT': (starts, list(up[::-1])),
+        'BUSDT': (starts, list((up * 3)[::-1])),
+        'CUSDT': (starts, list(noise[::-1])),
+    }
+    result = analyze_correlations(series, top_pairs=2, cluster_threshold=0.9)
+    assert (result['coins'], result['points']) == (3, 40)
+    assert len(result['pairs']) == 2
+    assert result['pairs'][0][:2] == ('AUSDT', 'BUSDT') and result['pairs'][0][2] == pytest.approx(1.0)
+    assert result['clusters'] == [{'symbols': ['AUSDT', 'BUSDT'], 'mean_correlation': 1.0}]
+
+def test_analyze_correlations_with_single_coin():
+    result = analyze_correlations({'AUSDT': ([3, 2, 1], [1.0, 2.0, 3.0])})
+    assert result == {'coins': 1, 'points': 3, 'pairs': [], 'clusters': []}
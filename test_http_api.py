@@ -0,0 +1,54 @@
+import pytest
+
+from http_api import ApiError, METRIC_FIELDS, TICKER_FIELDS, select_rows
+
+def make_rows(count):
+    return [
+        {'symbol': f'C{i:03d}USDT', 'base': f'C{i:03d}', 'quote': 'USDT' if i % 5 else 'USDC', 'last_price': 1.0,
+         'volume': 1.0, 'turnover': float(i % 7), 'market_cap': 0.0}
+        for i in range(count)
+    ]
+
+def collect_pages(rows, query):
+    seen = []
+    while True:
+        fields, page, next_cursor, total = select_rows(rows, query, TICKER_FIELDS)
+        seen.extend(page)
+        if not next_cursor:
+            return seen, total
+        query = dict(query, cursor=next_cursor)
+
+@pytest.mark.parametrize('sort', ['-turnover', 'turnover', 'symbol'])
+def test_cursor_pagination_visits_every_row_once(sort):
+    rows = make_rows(53)
+    seen, total = collect_pages(rows, {'limit': '10', 'sort': sort})
+    assert total == 53
+    symbols = [row['symbol'] for row in seen]
+    assert sorted(symbols) == sorted(row['symbol'] for row in rows)
+    assert len(symbols) == len(set(symbols))
+    field = sort.lstrip('-')
+    keys = [(row[field], row['symbol']) for row in seen]
+    assert keys == sorted(keys, reverse=sort.startswith('-'))
+
+def test_filters_and_fields():
+    rows = make_rows(20)
+    fields, page, next_cursor, total = select_rows(
+        rows, {'min_turnover': '5', 'quote': 'usdt', 'fields': 'symbol,turnover'}, TICKER_FIELDS
+    )
+    assert fields == ['symbol', 'turnover']
+    assert total == len([row for row in rows if row['turnover'] >= 5 and row['quote'] == 'USDT'])
+    assert all(row['turnover'] >= 5 for row in page)
+    assert next_cursor is None
+
+@pytest.mark.parametrize('query', [
+    {'sort': 'volatility'}, {'fields': 'nope'}, {'cursor': '!!!'}, {'limit': 'x'}, {'min_volatility': '1'},
+    {'max_turnover': 'много'},
+])
+def test_invalid_queries(query):
+    with pytest.raises(ApiError):
+        select_rows(make_rows(5), query, TICKER_FIELDS)
+
+def test_metric_fields_can_sort_by_volatility():
+    rows = [dict(row, volatility=float(i), drawdown=0.0, updated=0.0) for i, row in enumerate(make_rows(5))]
+    _, page, _, _ = select_rows(rows, {'sort': '-volatility', 'limit': '2'}, METRIC_FIELDS)
+    assert [row['volatility'] for row in page] == [4.0, 3.0]
@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from bot import fetch_instruments, filter_tradable, format_price, split_symbol
+
+INSTRUMENTS = {
+    'BTCUSDT': {'base': 'BTC', 'quote': 'USDT', 'tick_size': '0.01', 'status': 'Trading'},
+    'ETHBTC': {'base': 'ETH', 'quote': 'BTC', 'tick_size': '0.000001', 'status': 'Trading'},
+    'OLDUSDT': {'base': 'OLD', 'quote': 'USDT', 'tick_size': '0.0001', 'status': 'PreLaunch'},
+    # По названию эта пара разобралась бы как BTC/USD
+    'BTCUSDC': {'base': 'BTC', 'quote': 'USDC', 'tick_size': '0.01', 'status': 'Trading'},
+}
+
+COINS = {symbol: {'turnover': 1.0} for symbol in ('BTCUSDT', 'ETHBTC', 'OLDUSDT', 'BTCUSDC', 'GONEUSDT')}
+
+def test_filter_tradable_keeps_trading_pairs_with_quote():
+    assert set(filter_tradable(COINS, INSTRUMENTS, 'USDT')) == {'BTCUSDT'}
+    assert set(filter_tradable(COINS, INSTRUMENTS, 'USDC')) == {'BTCUSDC'}
+    assert set(filter_tradable(COINS, INSTRUMENTS)) == {'BTCUSDT', 'ETHBTC', 'BTCUSDC'}
+
+def test_filter_tradable_without_instruments_keeps_everything():
+    assert filter_tradable(COINS, {}, 'USDT') is COINS
+
+@pytest.mark.parametrize('symbol, expected', [
+    ('BTCUSDC', ('BTC', 'USDC')),
+    ('ETHBTC', ('ETH', 'BTC')),
+    # Пар нет в справочнике — разбор по названию
+    ('SOLUSDT', ('SOL', 'USDT')),
+    ('SOLEUR', ('SOL', 'EUR')),
+])
+def test_split_symbol(symbol, expected):
+    assert split_symbol(symbol, INSTRUMENTS) == expected
+
+@pytest.mark.parametrize('price, tick_size, expected', [
+    (65000.123, '0.01', '$65000.12'),
+    (0.0000123456, '0.00000001', '$0.00001235'),
+    (12.5, '1', '$12'),
+    (12.5, '0.10', '$12.5'),
+    (0.123456, '', '$0.1235'),
+    (12.345, '', '$12.35'),
+])
+def test_format_price_uses_tick_size(price, tick_size, expected):
+    assert format_price(price, tick_size) == expected
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self):
+        return self.data
+
+# Справочник из двух страниц, связанных курсором
+class FakeSession:
+    def __init__(self):
+        self.requests = []
+
+    @asynccontextmanager
+    async def get(self, url, params=None):
+        self.requests.append(dict(params))
+        if params.get('cursor') != 'page2':
+            page = {'list': [{'symbol': 'BTCUSDT', 'baseCoin': 'BTC', 'quoteCoin': 'USDT',
+                              'priceFilter': {'tickSize': '0.01'}, 'status': 'Trading'}],
+                    'nextPageCursor': 'page2'}
+        else:
+            page = {'list': [{'symbol': 'ETHBTC', 'baseCoin': 'ETH', 'quoteCoin': 'BTC', 'status': 'Trading'}],
+                    'nextPageCursor': ''}
+        yield FakeResponse({'retCode': 0, 'retMsg': 'OK', 'result': page})
+
+def test_fetch_instruments_follows_cursor():
+    session = FakeSession()
+    instruments = asyncio.run(fetch_instruments(session))
+    assert [request.get('cursor') for request in session.requests] == [None, 'page2']
+    assert instruments == {
+        'BTCUSDT': {'base': 'BTC', 'quote': 'USDT', 'tick_size': '0.01', 'status': 'Trading'},
+        'ETHBTC': {'base': 'ETH', 'quote': 'BTC', 'tick_size': '', 'status': 'Trading'},
+    }
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import market_decoding
+from market_decoding import decode_kline, decode_tickers
+
+KLINE = json.dumps({
+    'retCode': 0, 'retMsg': 'OK',
+    'result': {'symbol': 'BTCUSDT', 'category': 'spot', 'list': [
+        ['1700086400000', '36000', '36500', '35500', '36200.5', '10', '362000'],
+        ['1700000000000', '35000', '36100', '34900', '36000', '12', '432000'],
+    ]},
+}).encode()
+
+TICKERS = json.dumps({
+    'retCode': 0, 'retMsg': 'OK',
+    'result': {'category': 'spot', 'list': [
+        {'symbol': 'BTCUSDT', 'volume24h': '123.5', 'turnover24h': '4500000', 'lastPrice': '36200.5', 'bid1Price': '36200'},
+        {'symbol': 'NEWUSDT', 'volume24h': '', 'turnover24h': '0', 'marketCap': '1000', 'lastPrice': '0.01'},
+    ]},
+}).encode()
+
+# Bybit при ошибке отдает пустой result
+ERROR = json.dumps({'retCode': 10001, 'retMsg': 'params error', 'result': {}}).encode()
+
+@pytest.fixture(params=['msgspec', 'json'])
+def backend(request, monkeypatch):
+    if request.param == 'msgspec':
+        pytest.importorskip('msgspec')
+        monkeypatch.setattr(market_decoding, 'JSON_BACKEND', None)
+    else:
+        monkeypatch.setattr(market_decoding, 'JSON_BACKEND', 'json')
+        monkeypatch.setattr(market_decoding, 'orjson', None)
+    return request.param
+
+def test_decode_kline(backend):
+    ret_code, ret_msg, starts, closes = decode_kline(KLINE)
+    assert market_decoding.JSON_BACKEND == backend
+    assert (ret_code, ret_msg) == (0, 'OK')
+    assert list(starts) == [1700086400000, 1700000000000]
+    assert list(closes) == [36200.5, 36000.0]
+    assert (starts.typecode, closes.typecode) == ('q', 'd')
+
+def test_decode_tickers(backend):
+    ret_code, ret_msg, columns = decode_tickers(TICKERS)
+    assert (ret_code, ret_msg) == (0, 'OK')
+    assert columns['symbol'] == ['BTCUSDT', 'NEWUSDT']
+    assert list(columns['volume']) == [123.5, 0.0]
+    assert list(columns['turnover']) == [4500000.0, 0.0]
+    # Отсутствующие и пустые поля считаются нулем
+    assert list(columns['market_cap']) == [0.0, 1000.0]
+    assert list(columns['last_price']) == [36200.5, 0.01]
+
+def test_error_responses(backend):
+    ret_code, ret_msg, starts, closes = decode_kline(ERROR)
+    assert (ret_code, ret_msg, len(starts), len(closes)) == (10001, 'params error', 0, 0)
+    ret_code, ret_msg, columns = decode_tickers(ERROR)
+    assert (ret_code, ret_msg, columns['symbol'], len(columns['turnover'])) == (10001, 'params error', [], 0)
@@ -0,0 +1,31 @@
+import pytest
+
+from rankings import RankingIndex, Rankings
+
+def test_positions_and_percentiles_with_ties():
+    index = RankingIndex()
+    for symbol, value in (('A', 1.0), ('B', 2.0), ('C', 2.0), ('D', 4.0)):
+        index.update(symbol, value)
+    assert index.lookup('D') == (4.0, 1, 4, 75.0)
+    assert index.lookup('B') == (2.0, 2, 4, 25.0)
+    assert index.lookup('C') == (2.0, 2, 4, 25.0)
+    assert index.lookup('A') == (1.0, 4, 4, 0.0)
+    assert index.lookup('Z') is None
+
+def test_update_moves_existing_value():
+    index = RankingIndex()
+    for symbol, value in (('A', 1.0), ('B', 2.0), ('D', 4.0)):
+        index.update(symbol, value)
+    index.update('A', 5.0)
+    index.update('A', 5.0)
+    assert len(index) == 3
+    assert index.sorted_values == [2.0, 4.0, 5.0]
+    assert index.lookup('A') == (5.0, 1, 3, pytest.approx(200 / 3))
+    assert index.lookup('D') == (4.0, 2, 3, pytest.approx(100 / 3))
+
+def test_rankings_per_period_require_both_metrics():
+    rankings = Rankings()
+    rankings.update('BTCUSDT', 1, 3.0, 1.0)
+    rankings.update('ETHUSDT', 1, 5.0, 0.5)
+    assert rankings.lookup('BTCUSDT', 1) == {'volatility': (3.0, 2, 2, 0.0), 'drawdown': (1.0, 1, 2, 50.0)}
+    assert rankings.lookup('BTCUSDT', 7) is None
@@ -0,0 +1,52 @@
+import csv
+import io
+import sys
+
+import pytest
+
+from report_files import COLUMNS, render_report_file
+
+RESULTS = [
+    {'symbol': 'BTCUSDT', 'base': 'BTC', 'quote': 'USDT', 'last_price': 65000.5, 'volatility': 3.2,
+     'drawdown': 1.1, 'turnover': 1.5e9, 'volume': 23000.0, 'market_cap': 1.2e12},
+    {'symbol': 'ETHUSDT', 'base': 'ETH', 'quote': 'USDT', 'last_price': 3100.0, 'volatility': 4.8,
+     'drawdown': 2.5, 'turnover': 7.0e8, 'volume': 225000.0, 'market_cap': 0},
+]
+
+def read_csv(data):
+    return list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+
+def test_csv_has_header_and_numbered_rows():
+    data, extension = render_report_file('csv', RESULTS, 'Отчет')
+    assert extension == 'csv'
+    # BOM нужен Excel для кириллицы в заголовках
+    assert data.startswith(b'\xef\xbb\xbf')
+    rows = read_csv(data)
+    assert rows[0] == ['#'] + [name for _, name in COLUMNS]
+    assert rows[1][:3] == ['1', 'BTCUSDT', 'BTC']
+    assert rows[2][:2] == ['2', 'ETHUSDT']
+    assert len(rows) == 3
+
+def test_xlsx_contains_title_and_all_coins():
+    openpyxl = pytest.importorskip('openpyxl')
+    data, extension = render_report_file('xlsx', RESULTS, 'Отчет')
+    assert extension == 'xlsx'
+    sheet = openpyxl.load_workbook(io.BytesIO(data)).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0][0] == 'Отчет'
+    assert rows[1] == tuple(['#'] + [name for _, name in COLUMNS])
+    assert rows[2][:3] == (1, 'BTCUSDT', 'BTC')
+    assert len(rows) == 4
+
+def test_xlsx_falls_back_to_csv_without_openpyxl(monkeypatch):
+    # None в sys.modules заставляет import openpyxl падать с ImportError
+    monkeypatch.setitem(sys.modules, 'openpyxl', None)
+    data, extension = render_report_file('xlsx', RESULTS, 'Отчет')
+    assert extension == 'csv'
+    assert read_csv(data)[1][1] == 'BTCUSDT'
+
+def test_chart_is_png():
+    pytest.importorskip('matplotlib')
+    data, extension = render_report_file('chart', RESULTS, 'Отчет')
+    assert extension == 'png'
+    assert data.startswith(b'\x89PNG')
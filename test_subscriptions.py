@@ -0,0 +1,51 @@
+import json
+
+from subscriptions import ReportSubscription, ReportSubscriptions
+
+def test_add_remove_and_persist(tmp_path):
+    path = str(tmp_path / 'reports.json')
+    reports = ReportSubscriptions(path)
+    first = reports.add(100, 50, 'turnover', 7, 'volatility', '09:00')
+    second = reports.add(200, 100, 'market_cap', 1, 'drawdown', '18:30')
+    assert (first.id, second.id) == (1, 2)
+
+    # Удалить чужую подписку нельзя
+    assert not reports.remove(second.id, chat_id=100)
+    assert reports.remove(first.id, chat_id=100)
+    assert not reports.remove(first.id)
+
+    loaded = ReportSubscriptions(path)
+    loaded.load()
+    assert list(loaded.subscriptions.values()) == [second]
+    # Номера удаленных подписок не выдаются повторно
+    assert loaded.add(100, 50, 'turnover', 7, 'volatility', '09:00').id == 3
+    assert not (tmp_path / 'reports.json.tmp').exists()
+
+def test_load_missing_file_and_next_id_from_ids(tmp_path):
+    path = tmp_path / 'reports.json'
+    reports = ReportSubscriptions(str(path))
+    reports.load()
+    assert len(reports) == 0
+
+    # Файл без next_id (или с устаревшим) не приводит к повтору номеров
+    subscription = ReportSubscription(7, 100, 50, 'turnover', 7, 'volatility', '09:00')
+    path.write_text(json.dumps({'subscriptions': [subscription._asdict()]}), encoding='utf-8')
+    reports.load()
+    assert reports.subscriptions == {7: subscription}
+    assert reports.next_id == 8
+
+def test_due_groups_chats_by_report_configuration(tmp_path):
+    reports = ReportSubscriptions(str(tmp_path / 'reports.json'))
+    reports.add(100, 50, 'turnover', 7, 'volatility', '09:00')
+    reports.add(200, 50, 'turnover', 7, 'volatility', '09:00')
+    reports.add(200, 50, 'turnover', 7, 'volatility', '09:00')
+    reports.add(300, 50, 'turnover', 1, 'volatility', '09:00')
+    reports.add(400, 50, 'turnover', 7, 'volatility', '10:00')
+
+    assert reports.due('09:00') == {
+        (50, 'turnover', 7, 'volatility'): [100, 200],
+        (50, 'turnover', 1, 'volatility'): [300],
+    }
+    assert reports.due('10:00') == {(50, 'turnover', 7, 'volatility'): [400]}
+    assert reports.due('11:00') == {}
+    assert [s.id for s in reports.for_chat(200)] == [2, 3]
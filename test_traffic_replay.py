@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+
+import aiohttp
+import pytest
+
+import traffic_replay
+from traffic_replay import RecordingSession, ReplaySession, TrafficRecorder
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+# Сессия, отвечающая номером запроса к каждому пути
+class FakeSession:
+    def __init__(self):
+        self.calls = 0
+
+    @asynccontextmanager
+    async def get(self, url, params=None, **kwargs):
+        self.calls += 1
+        status = 500 if 'fail' in url else 200
+        yield FakeResponse(status, json.dumps({'url': url, 'n': self.calls}).encode())
+
+def record(path, requests):
+    async def scenario():
+        recorder = TrafficRecorder(path)
+        session = RecordingSession(FakeSession(), recorder)
+        for url, params in requests:
+            async with session.get(url, params=params) as response:
+                await response.read()
+        await asyncio.to_thread(recorder.close)
+        return recorder
+    return run(scenario())
+
+def test_record_and_replay_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(traffic_replay, 'FLUSH_EVERY', 2)
+    path = str(tmp_path / 'traffic.gz')
+    requests = [
+        ('https://api.bybit.com/v5/market/kline', {'symbol': 'BTCUSDT', 'start': 1}),
+        ('https://api.bybit.com/v5/market/kline', {'symbol': 'BTCUSDT', 'start': 2}),
+        ('https://api.bybit.com/v5/market/tickers', {'category': 'spot'}),
+        ('https://api.bybit.com/v5/fail', None),
+        ('https://api.bybit.com/v5/market/kline', {'symbol': 'ETHUSDT'}),
+    ]
+    assert record(path, requests).count == 5
+
+    async def scenario():
+        replay = ReplaySession(path, speed=0)
+        assert len(replay) == 5
+        # Одинаковые запросы (без учета start/end) получают ответы по порядку, затем повторяется последний
+        bodies = []
+        for _ in range(3):
+            async with replay.get('https://api.bybit.com/v5/market/kline', params={'symbol': 'BTCUSDT', 'start': 99}) as response:
+                bodies.append((await response.json())['n'])
+        assert bodies == [1, 2, 2]
+
+        async with replay.get('https://api.bybit.com/v5/fail') as response:
+            with pytest.raises(aiohttp.ClientResponseError):
+                response.raise_for_status()
+
+        with pytest.raises(aiohttp.ClientConnectionError):
+            async with replay.get('https://api.bybit.com/v5/market/kline', params={'symbol': 'SOLUSDT'}):
+                pass
+        assert (replay.served, replay.missed) == (4, 1)
+    run(scenario())
+
+def test_replay_keeps_complete_blocks_of_truncated_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(traffic_replay, 'FLUSH_EVERY', 2)
+    path = str(tmp_path / 'traffic.gz')
+    record(path, [('https://api.bybit.com/v5/market/kline', {'symbol': f'C{i}USDT'}) for i in range(4)])
+    # Обрыв посреди второго блока: первый блок остается читаемым
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-len(data) // 4])
+    assert len(ReplaySession(path, speed=0)) == 2
+
+def test_recorder_reports_write_errors_on_close(tmp_path):
+    path = tmp_path / 'traffic.gz'
+    recorder = TrafficRecorder(str(path))
+    os.remove(path)
+    os.mkdir(path)
+    recorder.record('https://api.bybit.com/v5/market/tickers', None, 200, 0.1, b'{}', recorder.started)
+    with pytest.raises(OSError):
+        recorder.close()
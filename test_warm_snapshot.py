@@ -0,0 +1,24 @@
+import pytest
+
+from warm_snapshot import load_snapshot, save_snapshot
+
+COINS = {
+    'BTCUSDT': {'volume': 1.5, 'turnover': 2.5, 'market_cap': 0.0, 'last_price': 65000.0},
+    'ЁЁUSDT': {'volume': 3.0, 'turnover': 4.0, 'market_cap': 5.0, 'last_price': 0.001},
+}
+METRICS = [('BTCUSDT', 1, 2.5, 1.25, 100.0), ('ETHUSDT', 7, 10.0, 4.0, 200.0)]
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    save_snapshot(path, COINS, 50.0, METRICS, 300.0)
+    assert load_snapshot(path) == (300.0, 50.0, COINS, METRICS)
+
+def test_missing_file(tmp_path):
+    assert load_snapshot(str(tmp_path / 'missing')) is None
+
+def test_truncated_file_reports_real_cause(tmp_path):
+    path = tmp_path / 'snapshot'
+    save_snapshot(str(path), COINS, 50.0, METRICS, 300.0)
+    path.write_bytes(path.read_bytes()[:-10])
+    with pytest.raises(ValueError, match='обрезан'):
+        load_snapshot(str(path))
@@ -0,0 +1,150 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+# Запись и воспроизведение HTTP-трафика к Bybit для воспроизводимого профилирования.
+# Архив — gzip-файл с JSON-строками, по одной на запрос:
+#   {"t": смещение от начала записи, "path": "/v5/market/kline", "params": {...},
+#    "status": 200, "duration": время ответа в секундах, "body": тело ответа}
+# Записи дописываются отдельными gzip-блоками по FLUSH_EVERY штук, поэтому при аварийной
+# остановке теряется только последний незаписанный блок. Сжатие и запись с fsync выполняются
+# в отдельном потоке, чтобы не задерживать цикл событий.
+# RecordingSession и ReplaySession повторяют ту часть интерфейса aiohttp.ClientSession,
+# которой пользуется бот: async with session.get(url, params=...) as response.
+
+# Параметры окна времени зависят от момента запроса, поэтому при поиске ответа не учитываются
+TIME_PARAMS = ('start', 'end')
+FLUSH_EVERY = 20
+
+def request_key(url, params):
+    path = urlsplit(url).path
+    return path, tuple(sorted((str(key), str(value)) for key, value in (params or {}).items() if key not in TIME_PARAMS))
+
+# Ответ из записи: raise_for_status, read и json как у aiohttp.ClientResponse
+class RecordedResponse:
+    def __init__(self, url, status, body):
+        self.url = url
+        self.status = status
+        self.body = body
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            url = URL(self.url)
+            request_info = aiohttp.RequestInfo(url, 'GET', CIMultiDictProxy(CIMultiDict()), url)
+            raise aiohttp.ClientResponseError(request_info, (), status=self.status, message=f'HTTP {self.status}')
+
+    async def read(self):
+        return self.body
+
+    async def json(self):
+        return json.loads(self.body)
+
+# Пишет запросы в архив блоками по мере выполнения
+class TrafficRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.pending = []
+        self.started = time.monotonic()
+        self.count = 0
+        self.error = None  # Первая ошибка записи, поднимается в close
+        # Один поток-писатель: блоки попадают в файл в порядке записи
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='traffic-recorder')
+        open(path, 'wb').close()
+
+    def record(self, url, params, status, duration, body, started):
+        entry = {
+            't': round(started - self.started, 4),
+            'path': urlsplit(url).path,
+            'params': {str(key): str(value) for key, value in (params or {}).items()},
+            'status': status,
+            'duration': round(duration, 4),
+            'body': body.decode('utf-8', errors='replace'),
+        }
+        self.pending.append(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.count += 1
+        if len(self.pending) >= FLUSH_EVERY:
+            self.flush()
+
+    # Передает накопленные записи потоку-писателю, не дожидаясь записи на диск
+    def flush(self):
+        if not self.pending:
+            return
+        lines, self.pending = self.pending, []
+        self.writer.submit(self.write_block, lines)
+
+    # Дописывает записи отдельным gzip-блоком; многоблочный файл читается gzip.open целиком
+    def write_block(self, lines):
+        try:
+            data = gzip.compress(''.join(lines).encode('utf-8'))
+            with open(self.path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            self.error = self.error or e
+
+    # Записывает остаток и ждет, пока поток-писатель закончит
+    def close(self):
+        self.flush()
+        self.writer.shutdown(wait=True)
+        if self.error:
+            raise self.error
+
+# Обертка над настоящей сессией: выполняет запрос и сохраняет ответ с временем выполнения
+class RecordingSession:
+    def __init__(self, session, recorder):
+        self.session = session
+        self.recorder = recorder
+
+    @asynccontextmanager
+    async def get(self, url, params=None, **kwargs):
+        started = time.monotonic()
+        async with self.session.get(url, params=params, **kwargs) as response:
+            body = await response.read()
+            self.recorder.record(url, params, response.status, time.monotonic() - started, body, started)
+            yield RecordedResponse(url, response.status, body)
+
+# Отдает записанные ответы вместо обращений к сети. Одинаковые запросы получают ответы
+# в порядке записи; когда записи закончились, повторяется последняя.
+# speed: 1 — с записанными задержками, 10 — в 10 раз быстрее, 0 — без задержек.
+class ReplaySession:
+    def __init__(self, path, speed=1.0):
+        self.speed = speed
+        self.responses = {}  # {(path, params): deque записей}
+        self.served = 0
+        self.missed = 0
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break
+                    entry = json.loads(line)
+                    self.responses.setdefault(request_key(entry['path'], entry['params']), deque()).append(entry)
+            except (EOFError, gzip.BadGzipFile):
+                # Запись прервана посреди блока: используем то, что успели прочитать
+                pass
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.responses.values())
+
+    @asynccontextmanager
+    async def get(self, url, params=None, **kwargs):
+        entries = self.responses.get(request_key(url, params))
+        if not entries:
+            self.missed += 1
+            raise aiohttp.ClientConnectionError(f'в записи нет ответа на {url} {params}')
+        entry = entries.popleft() if len(entries) > 1 else entries[0]
+        if self.speed > 0:
+            await asyncio.sleep(entry['duration'] / self.speed)
+        self.served += 1
+        yield RecordedResponse(url, entry['status'], entry['body'].encode('utf-8'))
@@ -0,0 +1,107 @@
+import mmap
+import os
+import struct
+from array import array
+
+# Компактный бинарный снимок таблицы тикеров и рассчитанных метрик для теплого перезапуска.
+#
+# Формат (little-endian, все массивы выровнены по 8 байт):
+#   заголовок HEADER
+#   тикеры: 4 массива float64 по n_coins (volume, turnover, market_cap, last_price)
+#   метрики: массивы int32 индексов символов и дней (вместе кратны 8 байтам),
+#            массивы float64 волатильности, просадки и времени расчета
+#   таблица символов: uint32 смещения (n_symbols + 1) и строка UTF-8 со всеми символами подряд
+SNAPSHOT_MAGIC = b'VBSN'
+SNAPSHOT_FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHxxddIIII')  # magic, версия, время записи, время тикеров, n_coins, n_metrics, n_symbols, размер строки
+COIN_COLUMNS = ('volume', 'turnover', 'market_cap', 'last_price')
+
+def align(size):
+    return (size + 7) & ~7
+
+def save_snapshot(path, coins, coins_time, metrics, saved_at):
+    # coins: {symbol: {volume, turnover, market_cap, last_price}}
+    # metrics: [(symbol, days, volatility, drawdown, updated)]
+    symbols = list(coins)
+    index = {symbol: i for i, symbol in enumerate(symbols)}
+    for symbol, *_ in metrics:
+        if symbol not in index:
+            index[symbol] = len(symbols)
+            symbols.append(symbol)
+
+    encoded = [symbol.encode() for symbol in symbols]
+    offsets = array('I', [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    blob = b''.join(encoded)
+
+    parts = [HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, saved_at, coins_time or 0.0,
+        len(coins), len(metrics), len(symbols), len(blob)
+    )]
+    parts.append(b'\0' * (align(HEADER.size) - HEADER.size))
+    for column in COIN_COLUMNS:
+        parts.append(array('d', [coins[symbol].get(column, 0) for symbol in symbols[:len(coins)]]).tobytes())
+    parts.append(array('i', [index[m[0]] for m in metrics]).tobytes())
+    parts.append(array('i', [m[1] for m in metrics]).tobytes())
+    for position in (2, 3, 4):
+        parts.append(array('d', [m[position] for m in metrics]).tobytes())
+    parts.append(offsets.tobytes())
+    parts.append(blob)
+
+    # Пишем во временный файл и атомарно подменяем, чтобы не оставить обрезанный снимок
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b''.join(parts))
+    os.replace(tmp_path, path)
+
+def load_snapshot(path):
+    # Возвращает (saved_at, coins_time, coins, metrics) или None, если снимка нет
+    if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+        return None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        chunks = []
+        try:
+            magic, version, saved_at, coins_time, n_coins, n_metrics, n_symbols, blob_size = HEADER.unpack_from(view)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION:
+                raise ValueError(f'неподдерживаемый формат снимка {magic!r} v{version}')
+            expected_size = (
+                align(HEADER.size) + len(COIN_COLUMNS) * 8 * n_coins + (4 + 4 + 8 * 3) * n_metrics
+                + 4 * (n_symbols + 1) + blob_size
+            )
+            if len(mapped) < expected_size:
+                raise ValueError(f'снимок обрезан: {len(mapped)} байт вместо {expected_size}')
+
+            offset = align(HEADER.size)
+            def take(fmt, count, itemsize):
+                nonlocal offset
+                chunk = view[offset:offset + count * itemsize].cast(fmt)
+                chunks.append(chunk)
+                offset += count * itemsize
+                return chunk
+
+            columns = [take('d', n_coins, 8) for _ in COIN_COLUMNS]
+            metric_symbols = take('i', n_metrics, 4)
+            metric_days = take('i', n_metrics, 4)
+            volatility = take('d', n_metrics, 8)
+            drawdown = take('d', n_metrics, 8)
+            updated = take('d', n_metrics, 8)
+            offsets = take('I', n_symbols + 1, 4)
+            blob = bytes(view[offset:offset + blob_size])
+            symbols = [blob[offsets[i]:offsets[i + 1]].decode() for i in range(n_symbols)]
+
+            coins = {
+                symbols[i]: {column: values[i] for column, values in zip(COIN_COLUMNS, columns)}
+                for i in range(n_coins)
+            }
+            metrics = [
+                (symbols[metric_symbols[i]], metric_days[i], volatility[i], drawdown[i], updated[i])
+                for i in range(n_metrics)
+            ]
+        finally:
+            # Все срезы должны быть освобождены до закрытия mmap, иначе его закрытие упадет с BufferError
+            for chunk in chunks:
+                chunk.release()
+            view.release()
+    return saved_at, coins_time, coins, metrics